@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Flask API性能基准测试
+功能：对 flask_api_example.py 中的数据结构进行性能对比
+运行：python flask_api_benchmark.py
+"""
+
+import json
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from flask_api_example import (
+    EncodedRecordCache, RouteMetrics, ShardedStore, StockError, StoreJournal, UserIndex,
+    adjust_stock, app, encode_json, products_db
+)
+
+
+def timeit(func, repeat=100):
+    """返回函数平均耗时（微秒）"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def benchmark_user_index(n=1_000_000):
+    """对比全表扫描与二级索引查询用户"""
+    print(f"=== 用户二级索引基准测试 ({n:,} 个用户) ===")
+    users = {
+        i: {'id': i, 'name': f'user{i}', 'email': f'user{i}@example.com', 'age': random.randint(18, 80)}
+        for i in range(1, n + 1)
+    }
+
+    start = time.perf_counter()
+    index = UserIndex()
+    # 批量构建有序索引，避免逐条 insort
+    for user in users.values():
+        index.by_email.setdefault(user['email'], set()).add(user['id'])
+    index.by_age = sorted((u['age'], u['id']) for u in users.values())
+    print(f"构建索引耗时: {time.perf_counter() - start:.2f} 秒")
+
+    target = f'user{n // 2}@example.com'
+    scan_email = timeit(lambda: [u for u in users.values() if u['email'] == target], repeat=3)
+    index_email = timeit(lambda: [users[i] for i in index.find_by_email(target)], repeat=10000)
+    print(f"按邮箱查询 - 全表扫描: {scan_email:,.1f} μs, 哈希索引: {index_email:,.2f} μs")
+
+    scan_age = timeit(lambda: [u for u in users.values() if 30 <= u['age'] <= 30], repeat=3)
+    index_age = timeit(lambda: [users[i] for i in index.find_by_age(30, 30)], repeat=20)
+    print(f"按年龄查询 - 全表扫描: {scan_age:,.1f} μs, 有序索引: {index_age:,.1f} μs")
+
+    new_user = {'id': n + 1, 'name': 'new', 'email': 'new@example.com', 'age': 42}
+    add_cost = timeit(lambda: (index.add(new_user), index.remove(new_user)), repeat=1000)
+    print(f"索引维护（插入+删除）: {add_cost:,.1f} μs")
+
+
+def run_threads(worker, thread_count):
+    """启动 thread_count 个线程执行 worker(线程序号)，返回总耗时（秒）"""
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(thread_count)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start
+
+
+def benchmark_store_concurrency(thread_count=8, ops_per_thread=20000):
+    """对比原全局变量、单一全局锁与分片存储在多线程下的吞吐量和数据正确性"""
+    print(f"\n=== 并发存储基准测试 ({thread_count} 线程 x {ops_per_thread:,} 次创建+读取) ===")
+    total = thread_count * ops_per_thread
+    # 缩短线程切换间隔，放大原实现中的竞态
+    old_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        # 1. 原实现：全局计数器 + 共享字典，无锁
+        legacy_db = {}
+        legacy_counter = [1]
+
+        def legacy_worker(_):
+            for _ in range(ops_per_thread):
+                new_id = legacy_counter[0]
+                legacy_db[new_id] = {'id': new_id, 'name': 'u'}
+                legacy_counter[0] = new_id + 1
+                legacy_db.get(new_id)
+
+        elapsed = run_threads(legacy_worker, thread_count)
+        print(f"原全局变量:   {total / elapsed:>10,.0f} ops/s, 丢失记录: {total - len(legacy_db):,}")
+
+        # 2. 单一全局锁：正确但串行化所有请求
+        locked_db = {}
+        locked_counter = [1]
+        global_lock = threading.Lock()
+
+        def locked_worker(_):
+            for _ in range(ops_per_thread):
+                with global_lock:
+                    new_id = locked_counter[0]
+                    locked_db[new_id] = {'id': new_id, 'name': 'u'}
+                    locked_counter[0] = new_id + 1
+                with global_lock:
+                    locked_db.get(new_id)
+
+        elapsed = run_threads(locked_worker, thread_count)
+        print(f"单一全局锁:   {total / elapsed:>10,.0f} ops/s, 丢失记录: {total - len(locked_db):,}")
+
+        # 3. ShardedStore：原子ID分配 + 分片锁
+        store = ShardedStore()
+
+        def store_worker(_):
+            for _ in range(ops_per_thread):
+                record = store.create({'name': 'u'})
+                store.get(record['id'])
+
+        elapsed = run_threads(store_worker, thread_count)
+        print(f"ShardedStore: {total / elapsed:>10,.0f} ops/s, 丢失记录: {total - len(store):,}")
+    finally:
+        sys.setswitchinterval(old_interval)
+
+
+def benchmark_batch_ingest(n=20000):
+    """对比逐条 POST /users 与 POST /users/batch（NDJSON）的导入速度"""
+    print(f"\n=== 批量导入基准测试 ({n:,} 个用户) ===")
+    client = app.test_client()
+    rows = [{'name': f'user{i}', 'email': f'user{i}@example.com', 'age': i % 80} for i in range(n)]
+
+    start = time.perf_counter()
+    for row in rows:
+        client.post('/users', json=row)
+    single = time.perf_counter() - start
+    print(f"逐条 POST /users:       {n / single:>10,.0f} 条/秒")
+
+    body = '\n'.join(json.dumps(row) for row in rows)
+    start = time.perf_counter()
+    client.post('/users/batch', data=body, content_type='application/x-ndjson')
+    batch = time.perf_counter() - start
+    print(f"POST /users/batch:      {n / batch:>10,.0f} 条/秒 (加速 {single / batch:.1f}x)")
+
+
+def benchmark_journal_reload(n=1_000_000, tail=10000):
+    """测试从快照 + WAL 尾部恢复 n 条记录的耗时"""
+    print(f"\n=== 持久化恢复基准测试 ({n:,} 条快照记录 + {tail:,} 条WAL) ===")
+    with tempfile.TemporaryDirectory() as data_dir:
+        store = ShardedStore()
+        journal = StoreJournal(data_dir, {'users': store}, snapshot_every=n * 10)
+        journal.recover()
+        store.create_many([
+            {'name': f'user{i}', 'email': f'user{i}@example.com', 'age': i % 80} for i in range(n)
+        ])
+        start = time.perf_counter()
+        journal.snapshot()
+        print(f"写入快照耗时: {time.perf_counter() - start:.2f} 秒")
+        for i in range(tail):
+            store.update(i + 1, {'age': 99})
+        journal.close()
+
+        restored = ShardedStore()
+        start = time.perf_counter()
+        StoreJournal(data_dir, {'users': restored}, snapshot_every=n * 10).recover()
+        elapsed = time.perf_counter() - start
+        print(f"恢复耗时: {elapsed:.2f} 秒, 记录数: {len(restored):,}")
+
+        start = time.perf_counter()
+        UserIndex().rebuild(restored.values())
+        print(f"重建用户索引耗时: {time.perf_counter() - start:.2f} 秒")
+
+
+def benchmark_hot_product_reservation(thread_count=64, stock=50000):
+    """64 个线程争抢同一个热门产品的库存，检查是否超卖"""
+    print(f"\n=== 热门产品库存预留基准测试 ({thread_count} 线程, 库存 {stock:,}) ===")
+    old_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        # 1. 无锁的读-改-写：检查与扣减之间可能被其他线程插入
+        naive = {'stock': stock}
+        naive_sold = [0] * thread_count
+
+        def naive_worker(n):
+            while True:
+                current = naive['stock']
+                if current <= 0:
+                    return
+                time.sleep(0)  # 模拟请求处理中检查与扣减之间的其他工作
+                naive['stock'] = current - 1
+                naive_sold[n] += 1
+
+        elapsed = run_threads(naive_worker, thread_count)
+        print(f"无锁读改写:     {sum(naive_sold) / elapsed:>10,.0f} 次/秒, "
+              f"售出 {sum(naive_sold):,} (超卖 {sum(naive_sold) - stock:,})")
+
+        # 2. adjust_stock：分片锁内原子扣减
+        product = products_db.create({'name': 'hot', 'price': 1.0, 'stock': stock})
+        sold = [0] * thread_count
+
+        def worker(n):
+            while True:
+                try:
+                    adjust_stock({product['id']: 1}, -1)
+                except StockError:
+                    return
+                sold[n] += 1
+
+        elapsed = run_threads(worker, thread_count)
+        print(f"adjust_stock:   {sum(sold) / elapsed:>10,.0f} 次/秒, "
+              f"售出 {sum(sold):,} (超卖 {sum(sold) - stock:,}), 剩余库存 {products_db[product['id']]['stock']}")
+    finally:
+        sys.setswitchinterval(old_interval)
+
+
+def benchmark_serialization(n=100_000):
+    """对比标准库 json、encode_json 与记录片段缓存拼接列表响应的耗时"""
+    print(f"\n=== 列表序列化基准测试 ({n:,} 个用户) ===")
+    store = ShardedStore()
+    cache = EncodedRecordCache(store)
+    store.create_many([{'name': f'用户{i}', 'email': f'user{i}@example.com', 'age': i % 80} for i in range(n)])
+    records = store.values()
+    payload = {'success': True, 'data': records, 'total': n}
+
+    print(f"标准库 json.dumps:  {timeit(lambda: json.dumps(payload), repeat=5) / 1000:>8,.1f} ms")
+    print(f"encode_json:        {timeit(lambda: encode_json(payload), repeat=5) / 1000:>8,.1f} ms")
+    cache.join(records)  # 预热片段缓存
+    store.update(1, {'age': 99})  # 单条记录变更只让该记录的片段失效
+    records = store.values()
+    print(f"片段缓存拼接:       {timeit(lambda: cache.join(records), repeat=5) / 1000:>8,.1f} ms")
+
+
+def benchmark_metrics_overhead(n=200_000):
+    """测量每个请求记录指标的额外开销"""
+    print(f"\n=== 请求指标开销基准测试 ({n:,} 次) ===")
+    metrics = RouteMetrics()
+
+    def record():
+        start = time.perf_counter()
+        metrics.start()
+        metrics.finish('GET', '/users/<int:user_id>', 200, time.perf_counter() - start)
+
+    print(f"每个请求开销: {timeit(record, repeat=n):.2f} μs")
+
+
+if __name__ == '__main__':
+    benchmark_user_index()
+    benchmark_store_concurrency()
+    benchmark_batch_ingest()
+    benchmark_journal_reload()
+    benchmark_hot_product_reservation()
+    benchmark_serialization()
+    benchmark_metrics_overhead()
@@ -5,34 +5,1008 @@ Flask API示例
 包含10个新增API接口：用户CRUD、产品CRUD、健康检查、时间接口、计算器接口
 """
 
+import gc
+import io
 import os
+import json
+import math
+import bisect
+import pickle
+import queue
+import itertools
+import operator
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import datetime
-from flask import Flask, jsonify, request
+from functools import wraps
+from flask import Flask, Response, g, jsonify, make_response, request
+from flask.json.provider import DefaultJSONProvider
 from dotenv import load_dotenv
 
+try:
+    import numpy as np
+except ImportError:  # NumPy 为可选依赖，未安装时批量计算退化为逐元素循环
+    np = None
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖，未安装时使用标准库 json
+    orjson = None
+
 # 加载.env文件中的环境变量
 load_dotenv()
 
+
+# ============= JSON 序列化：优先使用 orjson，回退到标准库 =============
+# 两条路径都沿用 Flask 的 default 钩子（日期、Decimal、UUID、dataclass 等），
+# NaN/Infinity 与 orjson 一致输出为 null，保证响应总是合法 JSON
+_json_encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), allow_nan=False,
+                                 default=DefaultJSONProvider.default)
+
+
+def _finite(obj):
+    """把嵌套结构中的 NaN/Infinity 替换为 None"""
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {key: _finite(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite(value) for value in obj]
+    return obj
+
+
+def encode_json(obj):
+    """把对象编码为 UTF-8 JSON 字节"""
+    if orjson is not None:
+        try:
+            # 日期交给 default 钩子，与 Flask 默认的 HTTP 日期格式保持一致
+            return orjson.dumps(obj, default=DefaultJSONProvider.default,
+                                option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except TypeError:  # orjson 不支持的类型（如超出 64 位的整数）交给标准库处理
+            pass
+    try:
+        return _json_encoder.encode(obj).encode()
+    except ValueError:  # 含有 NaN/Infinity，替换后重新编码
+        return _json_encoder.encode(_finite(obj)).encode()
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """让 jsonify 使用 encode_json；配置项 JSON_PRETTY 为真时输出缩进格式
+
+    每个响应都读取一次配置，与 app.debug 无关，调试模式下同样走快速编码。
+    """
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if self._app.config.get('JSON_PRETTY'):
+            return self._app.response_class(f'{self.dumps(_finite(obj), indent=2)}\n', mimetype=self.mimetype)
+        return self._app.response_class(encode_json(obj), mimetype=self.mimetype)
+
+
+class EncodedRecordCache:
+    """缓存每条记录编码后的 JSON 字节，列表响应直接拼接这些片段
+
+    存储采用写时复制，记录更新后是一个新对象，因此缓存项以记录对象本身校验，
+    并发读写时不会返回过期数据；变更回调负责及时释放旧条目。
+    安装了 orjson 时整体编码更快，缓存不生效。
+    """
+
+    def __init__(self, store):
+        self._entries = {}  # id -> (record, bytes)
+        store.add_hook(self.on_change)
+
+    def on_change(self, old, new):
+        self._entries.pop((old or new)['id'], None)
+
+    def encode(self, record):
+        if orjson is not None:
+            return encode_json(record)
+        entry = self._entries.get(record['id'])
+        if entry is not None and entry[0] is record:
+            return entry[1]
+        data = encode_json(record)
+        self._entries[record['id']] = (record, data)
+        return data
+
+    def join(self, records):
+        """返回逗号分隔的记录编码（不含方括号）"""
+        if orjson is not None:
+            # orjson 一次编码整个列表比逐条拼接片段更快，此时不使用缓存
+            return encode_json(records)[1:-1]
+        return b','.join(map(self.encode, records))
+
+
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
+app.config['JSON_PRETTY'] = os.environ.get('JSON_PRETTY', '').lower() in ('1', 'true')
 
 # 从环境变量获取name，默认值为'World'
 name = os.environ.get('name', 'World')
 
+# 设置 DATA_DIR 后启用 WAL + 快照持久化，否则数据只保存在内存中
+DATA_DIR = os.environ.get('DATA_DIR')
+SNAPSHOT_EVERY = int(os.environ.get('SNAPSHOT_EVERY', 100000))
+WAL_FSYNC = os.environ.get('WAL_FSYNC', '').lower() in ('1', 'true')
+
+
+@contextmanager
+def _gc_paused():
+    """一次性创建大量长期对象时暂停分代GC，避免反复扫描"""
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+class ShardedStore:
+    """线程安全的记录存储：原子ID分配 + 按键分段加锁（lock striping）
+
+    记录按 key % shard_count 分布在多个分片上，每个分片一把锁，
+    不同记录的读写互不阻塞。写操作采用写时复制，读者拿到的记录不会被并发修改。
+    """
+
+    def __init__(self, records=(), shard_count=16):
+        self._shards = [{} for _ in range(shard_count)]
+        self._locks = [threading.Lock() for _ in range(shard_count)]
+        self._ids_lock = threading.Lock()
+        self._ids = []  # 按ID升序维护的主键列表，用于游标（keyset）分页
+        self._next_id = 1
+        self._hooks = []
+        # 集合版本号与记录版本号：每次写入递增，用于生成 ETag
+        self._version_lock = threading.Lock()
+        self.version = 0
+        self._base_version = 0  # 未单独修改过的记录的版本号
+        self._record_versions = {}  # 只保存现存记录，删除时一并移除
+        for record in records:
+            self._shard(record['id'])[record['id']] = record
+            self._ids.append(record['id'])
+        self._ids.sort()
+        if self._ids:
+            self._next_id = self._ids[-1] + 1
+
+    def _shard(self, key):
+        return self._shards[key % len(self._shards)]
+
+    def lock_for(self, key):
+        """返回 key 所在分片的锁"""
+        return self._locks[key % len(self._locks)]
+
+    def add_hook(self, hook):
+        """注册变更回调 hook(old, new)，在分片锁内调用；新增时 old 为 None，删除时 new 为 None
+
+        记录写入后才调用回调，单个回调抛出异常只记录日志，不影响其余回调执行。
+        """
+        self._hooks.append(hook)
+
+    def _notify(self, old, new):
+        with self._version_lock:
+            self.version += 1
+            if new is not None:
+                self._record_versions[new['id']] = self.version
+            else:
+                # 不保留墓碑：不存在的记录没有版本号，同一ID重新写入时会得到更大的新版本号
+                self._record_versions.pop(old['id'], None)
+        for hook in self._hooks:
+            try:
+                hook(old, new)
+            except Exception:
+                app.logger.exception('变更回调 %r 执行失败', hook)
+
+    def record_version(self, key):
+        """返回记录最近一次写入时的版本号；记录不存在时返回 None
+
+        先取版本号再检查记录是否存在：删除时版本号已被移除，这里必然看到记录不存在，
+        不会把基础版本号当作已删除记录的版本号返回。
+        """
+        version = self._record_versions.get(key, self._base_version)
+        return version if key in self else None
+
+    def allocate_id(self):
+        """原子地分配下一个ID，并按序登记到主键列表"""
+        with self._ids_lock:
+            new_id = self._next_id
+            self._next_id += 1
+            self._ids.append(new_id)
+            return new_id
+
+    def allocate_ids(self, count):
+        """原子地分配一段连续ID"""
+        with self._ids_lock:
+            new_ids = range(self._next_id, self._next_id + count)
+            self._next_id += count
+            self._ids.extend(new_ids)
+            return new_ids
+
+    def get(self, key, default=None):
+        return self._shard(key).get(key, default)
+
+    def __getitem__(self, key):
+        return self._shard(key)[key]
+
+    def __contains__(self, key):
+        return key in self._shard(key)
+
+    def __len__(self):
+        return sum(map(len, self._shards))
+
+    def values(self):
+        """按ID升序返回所有记录"""
+        with self._ids_lock:
+            ids = list(self._ids)
+        return [record for record in map(self.get, ids) if record is not None]
+
+    def ids_after(self, after=None, limit=None):
+        """返回 ID 大于 after 的前 limit 个 ID"""
+        with self._ids_lock:
+            start = 0 if after is None else bisect.bisect_right(self._ids, after)
+            end = len(self._ids) if limit is None else start + limit
+            return self._ids[start:end]
+
+    def put(self, record):
+        """按记录自带的ID插入或替换记录（用于 WAL 重放）"""
+        key = record['id']
+        with self.lock_for(key):
+            old = self._shard(key).get(key)
+            self._shard(key)[key] = record
+            self._notify(old, record)
+        if old is None:
+            with self._ids_lock:
+                bisect.insort(self._ids, key)
+                self._next_id = max(self._next_id, key + 1)
+        return record
+
+    def dump_state(self):
+        """导出可序列化的存储状态（逐个分片加锁复制）"""
+        shards = []
+        for shard, lock in zip(self._shards, self._locks):
+            with lock:
+                shards.append(dict(shard))
+        with self._ids_lock:
+            next_id = self._next_id
+        # 主键列表按分片内容重建，排除已分配但尚未写入的ID
+        ids = sorted(key for shard in shards for key in shard)
+        return {'next_id': next_id, 'ids': ids, 'shards': shards}
+
+    def load_state(self, state):
+        """用 dump_state() 导出的状态替换当前内容，不触发变更回调"""
+        shards = state['shards']
+        if len(shards) != len(self._shards):
+            records = [record for shard in shards for record in shard.values()]
+            shards = [{} for _ in self._shards]
+            for record in records:
+                shards[record['id'] % len(shards)][record['id']] = record
+        with self._ids_lock:
+            self._shards = shards
+            self._ids = state['ids']
+            self._next_id = state['next_id']
+        with self._version_lock:
+            self.version += 1
+            self._base_version = self.version
+            self._record_versions = {}
+
+    def create(self, fields):
+        """分配ID并插入新记录，返回新记录"""
+        new_id = self.allocate_id()
+        # 分配后到写入分片前，ID 已出现在主键列表中，读取方需跳过 get() 为 None 的ID
+        record = {'id': new_id, **fields}
+        with self.lock_for(new_id):
+            self._shard(new_id)[new_id] = record
+            self._notify(None, record)
+        return record
+
+    def create_many(self, fields_list):
+        """批量插入新记录：一次分配整段ID，每个分片只加一次锁"""
+        new_ids = self.allocate_ids(len(fields_list))
+        by_shard = {}
+        records = []
+        for new_id, fields in zip(new_ids, fields_list):
+            record = {'id': new_id, **fields}
+            records.append(record)
+            by_shard.setdefault(new_id % len(self._shards), []).append(record)
+        for shard_no, shard_records in by_shard.items():
+            shard = self._shards[shard_no]
+            with self._locks[shard_no]:
+                for record in shard_records:
+                    shard[record['id']] = record
+                    self._notify(None, record)
+        return records
+
+    def update(self, key, fields):
+        """更新记录，返回新记录；记录不存在时返回 None"""
+        with self.lock_for(key):
+            old = self._shard(key).get(key)
+            if old is None:
+                return None
+            new = {**old, **fields}
+            self._shard(key)[key] = new
+            self._notify(old, new)
+            return new
+
+    @contextmanager
+    def locked(self, keys):
+        """同时持有多个键所在的分片锁；按分片序号顺序加锁，避免死锁"""
+        shard_nos = sorted({key % len(self._locks) for key in keys})
+        for shard_no in shard_nos:
+            self._locks[shard_no].acquire()
+        try:
+            yield
+        finally:
+            for shard_no in reversed(shard_nos):
+                self._locks[shard_no].release()
+
+    def modify(self, keys, func):
+        """原子地读-改-写多条记录，返回新记录列表
+
+        func 接收与 keys 对应的当前记录列表（不存在的记录为 None），
+        返回各记录要更新的字段列表；func 抛出异常时不写入任何记录。
+        """
+        with self.locked(keys):
+            old_records = [self._shard(key).get(key) for key in keys]
+            changes = func(old_records)
+            new_records = []
+            for key, old, fields in zip(keys, old_records, changes):
+                new = {**old, **fields}
+                self._shard(key)[key] = new
+                self._notify(old, new)
+                new_records.append(new)
+            return new_records
+
+    def delete(self, key):
+        """删除记录，返回被删除的记录；记录不存在时返回 None"""
+        with self.lock_for(key):
+            old = self._shard(key).pop(key, None)
+            if old is None:
+                return None
+            self._notify(old, None)
+        with self._ids_lock:
+            pos = bisect.bisect_left(self._ids, key)
+            if pos < len(self._ids) and self._ids[pos] == key:
+                del self._ids[pos]
+        return old
+
+
+class JournalError(Exception):
+    """WAL 写入失败，变更没有持久化"""
+
+
+class StoreJournal:
+    """存储持久化：追加写 WAL（write-ahead log）+ 定期快照
+
+    变更回调在分片锁内只做编码和入队，由单个写线程批量写入当前 WAL 段
+    （group commit），写入 IO 不会串行化各分片的写操作；请求结束前调用
+    wait_written() 等待本线程的变更写入文件。快照时先切换到新的 WAL 段，
+    再把各存储的分片整体写入快照文件，最后删除已被快照覆盖的旧 WAL 段。
+    启动时加载最新快照，只重放快照之后的 WAL 段。
+    WAL 中记录的是变更后的完整记录，重放是幂等的。
+    写入失败（如磁盘已满）后日志进入失败状态，之后的 wait_written() 都抛出
+    JournalError，需要排除故障后重启服务，从快照和 WAL 恢复。
+
+    快照使用 pickle 格式，加载时可以执行任意代码：DATA_DIR 必须只允许本服务写入，
+    不要从不可信的来源复制快照文件。
+    """
+
+    SNAPSHOT_FILE = 'snapshot.pkl'
+    WRITE_BATCH = 1000  # 写线程每次最多合并写入的记录数
+    WAIT_TIMEOUT = 30  # wait_written() 最长等待秒数
+
+    def __init__(self, data_dir, stores, snapshot_every=100000, fsync=False):
+        self.data_dir = data_dir
+        self.stores = stores  # {'users': users_db, ...}
+        self.snapshot_every = snapshot_every
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._snapshot_lock = threading.Lock()
+        self._wal = None
+        self._wal_seq = 0
+        self._entries = 0
+        # (序号, 编码后的行) 按序入队，由写线程落盘；_written_seq 为已写入的最大序号
+        self._queue = queue.SimpleQueue()
+        self._enqueue_lock = threading.Lock()
+        self._next_seq = 0
+        self._written_seq = 0
+        self._written = threading.Condition()
+        self._error = None  # 写线程遇到的第一个写入异常
+        self._local = threading.local()
+        self._writer = None
+        os.makedirs(data_dir, exist_ok=True)
+
+    def _wal_path(self, seq):
+        return os.path.join(self.data_dir, f'wal-{seq:08d}.log')
+
+    def _wal_segments(self):
+        return sorted(
+            int(filename[4:-4]) for filename in os.listdir(self.data_dir)
+            if filename.startswith('wal-') and filename.endswith('.log')
+        )
+
+    def recover(self):
+        """加载最新快照并重放其后的 WAL，然后开始记录新的变更"""
+        snapshot_path = os.path.join(self.data_dir, self.SNAPSHOT_FILE)
+        start_seq = 0
+        has_snapshot = os.path.exists(snapshot_path)
+        if has_snapshot:
+            with _gc_paused(), open(snapshot_path, 'rb') as f:
+                snapshot = pickle.load(f)  # 快照文件视为可信数据，见类说明
+            start_seq = snapshot['wal_seq']
+            for store_name, state in snapshot['stores'].items():
+                if store_name in self.stores:
+                    self.stores[store_name].load_state(state)
+
+        segments = [seq for seq in self._wal_segments() if seq >= start_seq]
+        for seq in segments:
+            self._replay(self._wal_path(seq))
+
+        # 不续写可能残缺的旧段，总是从新段开始
+        self._wal_seq = max(segments + [start_seq]) + 1
+        self._wal = open(self._wal_path(self._wal_seq), 'ab')
+        self._writer = threading.Thread(target=self._write_loop, name='wal-writer', daemon=True)
+        self._writer.start()
+        for store_name, store in self.stores.items():
+            store.add_hook(self._make_hook(store_name))
+        if not has_snapshot:
+            self.snapshot()
+
+    def _replay(self, path):
+        with open(path, 'rb') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break  # 进程崩溃时写了一半的尾行
+                store = self.stores.get(entry['c'])
+                if store is None:
+                    continue
+                if 'r' in entry:
+                    store.put(entry['r'])
+                else:
+                    store.delete(entry['d'])
+
+    def _make_hook(self, store_name):
+        def hook(old, new):
+            if new is not None:
+                self.append({'c': store_name, 'r': new})
+            else:
+                self.append({'c': store_name, 'd': old['id']})
+        return hook
+
+    def append(self, entry):
+        """把一条 WAL 记录交给写线程；调用方持有分片锁，这里只编码和入队，不做 IO"""
+        line = encode_json(entry) + b'\n'
+        with self._enqueue_lock:  # 保证入队顺序与序号一致
+            self._next_seq += 1
+            seq = self._next_seq
+            self._queue.put((seq, line))
+        self._local.last_seq = seq
+
+    def _write_loop(self):
+        """写线程：合并排队的记录一次写入，达到 snapshot_every 条后在后台生成快照"""
+        while True:
+            batch = [self._queue.get()]
+            while batch[-1] is not None and len(batch) < self.WRITE_BATCH:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = batch[-1] is None
+            if stop:
+                batch.pop()
+            if batch and self._error is None:
+                try:
+                    with self._lock:
+                        self._wal.writelines(line for _, line in batch)
+                        self._wal.flush()
+                        if self.fsync:
+                            os.fsync(self._wal.fileno())
+                        self._entries += len(batch)
+                        due = self._entries >= self.snapshot_every
+                        if due:
+                            self._entries = 0
+                except Exception as e:
+                    # 段尾可能留下半行，不再续写；继续取出队列中的记录，只唤醒等待者报错
+                    app.logger.exception('WAL 写入失败')
+                    with self._written:
+                        self._error = e
+                        self._written.notify_all()
+                    continue
+                with self._written:
+                    self._written_seq = batch[-1][0]
+                    self._written.notify_all()
+                if due:
+                    threading.Thread(target=self.snapshot, daemon=True).start()
+            if stop:
+                return
+
+    def wait_written(self):
+        """等待当前线程提交的 WAL 记录全部写入文件（开启 fsync 时已落盘）
+
+        写入失败或等待超过 WAIT_TIMEOUT 秒时抛出 JournalError；每次调用后清除本线程
+        记下的序号，同一线程之后的只读请求不会再因为这次失败报错。
+        """
+        seq = getattr(self._local, 'last_seq', 0)
+        self._local.last_seq = 0
+        if self._written_seq >= seq:
+            return
+        with self._written:
+            self._written.wait_for(
+                lambda: self._written_seq >= seq or self._error is not None, timeout=self.WAIT_TIMEOUT)
+            if self._written_seq >= seq:
+                return
+            if self._error is not None:
+                raise JournalError('WAL 写入失败') from self._error
+            raise JournalError('等待 WAL 写入超时')
+
+    def snapshot(self):
+        """切换 WAL 段并写入快照，返回快照对应的 WAL 段号"""
+        if not self._snapshot_lock.acquire(blocking=False):
+            return None  # 已有快照在进行
+        try:
+            with self._lock:
+                if self._wal is None:
+                    return None  # 已关闭
+                self._wal.close()
+                self._wal_seq += 1
+                self._wal = open(self._wal_path(self._wal_seq), 'ab')
+                wal_seq = self._wal_seq
+            snapshot = {
+                'wal_seq': wal_seq,
+                'stores': {store_name: store.dump_state() for store_name, store in self.stores.items()}
+            }
+            snapshot_path = os.path.join(self.data_dir, self.SNAPSHOT_FILE)
+            tmp_path = snapshot_path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, snapshot_path)
+            for seq in self._wal_segments():
+                if seq < wal_seq:
+                    os.remove(self._wal_path(seq))
+            return wal_seq
+        finally:
+            self._snapshot_lock.release()
+
+    def close(self):
+        """写完排队中的记录后关闭 WAL"""
+        if self._writer is not None:
+            self._queue.put(None)
+            self._writer.join()
+            self._writer = None
+        with self._lock:
+            if self._wal is not None:
+                self._wal.close()
+                self._wal = None
+
+
+class UserIndex:
+    """用户二级索引：email哈希索引 + age有序索引"""
+
+    def __init__(self):
+        self.by_email = {}  # email -> {user_id, ...}
+        self.by_age = []    # 按 (age, user_id) 排序的列表
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _age_key(user):
+        age = user.get('age')
+        # 只索引有限的数值型年龄，非数值和 NaN/Infinity 无法参与范围比较
+        if isinstance(age, (int, float)) and not isinstance(age, bool) and math.isfinite(age):
+            return (age, user['id'])
+        return None
+
+    def add(self, user):
+        with self._lock:
+            self._add(user)
+
+    def rebuild(self, users):
+        """批量重建索引，比逐条 add 快得多"""
+        by_email = {}
+        by_age = []
+        with _gc_paused():
+            for user in users:
+                by_email.setdefault(user['email'], set()).add(user['id'])
+                key = self._age_key(user)
+                if key is not None:
+                    by_age.append(key)
+            by_age.sort()
+        with self._lock:
+            self.by_email = by_email
+            self.by_age = by_age
+
+    def remove(self, user):
+        with self._lock:
+            self._remove(user)
+
+    def on_change(self, old, new):
+        """ShardedStore 变更回调，保持索引与存储一致"""
+        with self._lock:
+            if old is not None:
+                self._remove(old)
+            if new is not None:
+                self._add(new)
+
+    def _add(self, user):
+        self.by_email.setdefault(user['email'], set()).add(user['id'])
+        key = self._age_key(user)
+        if key is not None:
+            bisect.insort(self.by_age, key)
+
+    def _remove(self, user):
+        ids = self.by_email.get(user['email'])
+        if ids is not None:
+            ids.discard(user['id'])
+            if not ids:
+                del self.by_email[user['email']]
+        key = self._age_key(user)
+        if key is not None:
+            pos = bisect.bisect_left(self.by_age, key)
+            if pos < len(self.by_age) and self.by_age[pos] == key:
+                del self.by_age[pos]
+
+    def find_by_email(self, email):
+        """O(1) 按邮箱查找用户ID"""
+        with self._lock:
+            return set(self.by_email.get(email, ()))
+
+    def find_by_age(self, age_min=None, age_max=None):
+        """O(log n + k) 按年龄范围查找用户ID，结果按年龄升序"""
+        with self._lock:
+            return self._find_by_age(age_min, age_max)
+
+    def _find_by_age(self, age_min, age_max):
+        lo = 0 if age_min is None else bisect.bisect_left(self.by_age, (age_min,))
+        hi = len(self.by_age) if age_max is None else bisect.bisect_right(self.by_age, (age_max, float('inf')))
+        return [user_id for _, user_id in self.by_age[lo:hi]]
+
+
+def _is_non_finite(value):
+    """JSON 中的 NaN/Infinity 会被解析为浮点数，用户字段不接受这些值"""
+    return isinstance(value, float) and not math.isfinite(value)
+
+
 # 模拟用户数据存储
-users_db = {
-    1: {'id': 1, 'name': '张三', 'email': 'zhangsan@example.com', 'age': 25},
-    2: {'id': 2, 'name': '李四', 'email': 'lisi@example.com', 'age': 30},
-    3: {'id': 3, 'name': '王五', 'email': 'wangwu@example.com', 'age': 28}
-}
-user_id_counter = 4
+users_db = ShardedStore([
+    {'id': 1, 'name': '张三', 'email': 'zhangsan@example.com', 'age': 25},
+    {'id': 2, 'name': '李四', 'email': 'lisi@example.com', 'age': 30},
+    {'id': 3, 'name': '王五', 'email': 'wangwu@example.com', 'age': 28}
+])
 
 # 模拟产品数据存储
-products_db = {
-    1: {'id': 1, 'name': '笔记本电脑', 'price': 5999.00, 'stock': 100},
-    2: {'id': 2, 'name': '智能手机', 'price': 3999.00, 'stock': 200},
-    3: {'id': 3, 'name': '无线耳机', 'price': 299.00, 'stock': 500}
-}
-product_id_counter = 4
+products_db = ShardedStore([
+    {'id': 1, 'name': '笔记本电脑', 'price': 5999.00, 'stock': 100},
+    {'id': 2, 'name': '智能手机', 'price': 3999.00, 'stock': 200},
+    {'id': 3, 'name': '无线耳机', 'price': 299.00, 'stock': 500}
+])
+
+journal = None
+if DATA_DIR:
+    journal = StoreJournal(DATA_DIR, {'users': users_db, 'products': products_db},
+                           snapshot_every=SNAPSHOT_EVERY, fsync=WAL_FSYNC)
+    journal.recover()
+
+
+@app.after_request
+def _wait_for_wal(response):
+    # 变更在分片锁外由写线程落盘，响应前确认本请求的变更已写入 WAL
+    if journal is not None:
+        try:
+            journal.wait_written()
+        except JournalError:
+            app.logger.exception('请求的变更未能写入 WAL')
+            return make_response(jsonify({
+                'success': False,
+                'message': '数据持久化失败，请稍后重试'
+            }), 500)
+    return response
+
+
+user_records = EncodedRecordCache(users_db)
+product_records = EncodedRecordCache(products_db)
+
+# 索引在恢复数据之后批量构建
+user_index = UserIndex()
+user_index.rebuild(users_db.values())
+users_db.add_hook(user_index.on_change)
+if journal is not None:
+    # 恢复出的数据长期存活，移出GC跟踪范围
+    gc.freeze()
+
+DEFAULT_PAGE_LIMIT = 100
+MAX_PAGE_LIMIT = 1000
+STREAM_CHUNK_SIZE = 500
+
+
+def _records_response(cache, records, **fields):
+    """用缓存的记录片段拼接 {"success":true,"data":[...], ...fields} 响应"""
+    body = b''.join((b'{"success":true,"data":[', cache.join(records), b'],', encode_json(fields)[1:]))
+    return Response(body, mimetype='application/json')
+
+
+def _stream_records(store, cache, after=None, limit=None):
+    """分块生成 JSON 响应，内存占用与集合大小无关"""
+    yield b'{"success":true,"data":['
+    count = 0
+    while limit is None or count < limit:
+        chunk_size = STREAM_CHUNK_SIZE if limit is None else min(STREAM_CHUNK_SIZE, limit - count)
+        chunk_ids = store.ids_after(after, chunk_size)
+        if not chunk_ids:
+            break
+        after = chunk_ids[-1]
+        records = [record for record in map(store.get, chunk_ids) if record is not None]
+        if records:
+            body = cache.join(records)
+            yield body if count == 0 else b',' + body
+            count += len(records)
+    yield b'],"total":%d}' % count
+
+
+def _list_response(store, cache):
+    """按 after/limit/stream 参数返回集合列表"""
+    after = request.args.get('after', type=int)
+    limit = request.args.get('limit', type=int)
+
+    if request.args.get('stream', '').lower() in ('1', 'true'):
+        if limit is not None:
+            limit = max(0, limit)
+        return Response(_stream_records(store, cache, after, limit), mimetype='application/json')
+
+    if after is None and limit is None:
+        records = store.values()
+        return _records_response(cache, records, total=len(records))
+
+    limit = max(1, min(limit or DEFAULT_PAGE_LIMIT, MAX_PAGE_LIMIT))
+    # 多取一条用于判断是否还有下一页
+    page_ids = store.ids_after(after, limit + 1)
+    records = [record for record in map(store.get, page_ids[:limit]) if record is not None]
+    return _records_response(cache, records, total=len(store),
+                             next_after=page_ids[limit - 1] if len(page_ids) > limit else None)
+
+
+# ============= 条件请求：ETag + 已编码响应缓存 =============
+# 每个进程一个随机纪元，重启后版本号从头计数也不会与旧 ETag 冲突
+ETAG_EPOCH = uuid.uuid4().hex[:8]
+RESPONSE_CACHE_ENTRIES = 1024
+RESPONSE_CACHE_BYTES = 64 * 1024 * 1024
+
+
+class ResponseCache:
+    """有界 LRU 缓存：按 URL 缓存已编码的响应体及其版本号"""
+
+    def __init__(self, max_entries=RESPONSE_CACHE_ENTRIES, max_bytes=RESPONSE_CACHE_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (version, body)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, version, body):
+        # 单个响应过大时不缓存，避免挤掉其他所有条目
+        if len(body) > self.max_bytes // 4:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[1])
+            self._entries[key] = (version, body)
+            self._bytes += len(body)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+
+response_cache = ResponseCache()
+
+
+def conditional_get(version_of):
+    """装饰器：为 GET 接口生成强 ETag，命中 If-None-Match 时返回 304，
+    未命中时优先使用缓存的响应字节，跳过 jsonify。
+
+    version_of 接收与视图函数相同的关键字参数，返回当前数据版本号；
+    返回 None 表示数据不存在，此时直接调用视图函数，不返回 304 也不使用缓存。
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            version = version_of(**kwargs)
+            if version is None:
+                return f(*args, **kwargs)
+            etag = f'{ETAG_EPOCH}-{version}'
+            if request.if_none_match.contains(etag):
+                response = Response(status=304)
+                response.set_etag(etag)
+                return response
+
+            key = request.full_path
+            body = response_cache.get(key, version)
+            if body is None:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+                body = response.get_data()
+                response_cache.put(key, version, body)
+            response = Response(body, mimetype='application/json')
+            response.set_etag(etag)
+            return response
+        return decorated_function
+    return decorator
+
+
+# ============= 请求指标：计数、错误数、并发数、延迟直方图 =============
+# 延迟桶上界（秒）：50μs 起按 1.5 倍递增，覆盖到约 30 秒
+LATENCY_BUCKETS = tuple(0.00005 * 1.5 ** i for i in range(34))
+
+
+class LatencyHistogram:
+    """固定桶延迟直方图，内存占用与请求数无关"""
+
+    __slots__ = ('counts', 'count', 'sum')
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)  # 最后一个桶为 +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def merge(self, other):
+        for i, n in enumerate(other.counts):
+            self.counts[i] += n
+        self.count += other.count
+        self.sum += other.sum
+
+    def quantile(self, q):
+        """按桶内线性插值估算分位数（秒），没有样本时返回 None"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = LATENCY_BUCKETS[i - 1] if i > 0 else 0.0
+                upper = LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else lower
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return LATENCY_BUCKETS[-1]
+
+
+class RouteMetrics:
+    """按 (方法, 路由) 聚合的请求指标；5xx 响应计为错误"""
+
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}  # (method, route) -> [requests, errors, LatencyHistogram]
+        self.in_flight = 0
+
+    def start(self):
+        with self._lock:
+            self.in_flight += 1
+
+    def finish(self, method, route, status, seconds):
+        with self._lock:
+            self.in_flight -= 1
+            stats = self._routes.get((method, route))
+            if stats is None:
+                stats = self._routes[(method, route)] = [0, 0, LatencyHistogram()]
+            stats[0] += 1
+            if status >= 500:
+                stats[1] += 1
+            stats[2].observe(seconds)
+
+    def _snapshot(self):
+        with self._lock:
+            routes = {}
+            for key, (requests, errors, histogram) in self._routes.items():
+                copy = LatencyHistogram()
+                copy.merge(histogram)
+                routes[key] = (requests, errors, copy)
+            return routes, self.in_flight
+
+    def summary(self):
+        """所有路由合计的指标摘要，延迟单位为毫秒"""
+        routes, in_flight = self._snapshot()
+        total = LatencyHistogram()
+        for _, _, histogram in routes.values():
+            total.merge(histogram)
+        latency = {}
+        for q in self.QUANTILES:
+            value = total.quantile(q)
+            latency[f'p{int(q * 100)}'] = None if value is None else round(value * 1000, 3)
+        return {
+            'requests': sum(r[0] for r in routes.values()),
+            'errors': sum(r[1] for r in routes.values()),
+            'in_flight': in_flight,
+            'latency_ms': latency
+        }
+
+    def render_prometheus(self):
+        """输出 Prometheus 文本格式"""
+        routes, in_flight = self._snapshot()
+        lines = [
+            '# HELP http_requests_in_flight Requests currently being processed.',
+            '# TYPE http_requests_in_flight gauge',
+            f'http_requests_in_flight {in_flight}',
+            '# HELP http_requests_total Total HTTP requests.',
+            '# TYPE http_requests_total counter'
+        ]
+        labels = {key: f'method="{key[0]}",route="{_escape_label(key[1])}"' for key in routes}
+        for key, (requests, _, _) in sorted(routes.items()):
+            lines.append(f'http_requests_total{{{labels[key]}}} {requests}')
+        lines += ['# HELP http_request_errors_total HTTP requests that ended with a 5xx status.',
+                  '# TYPE http_request_errors_total counter']
+        for key, (_, errors, _) in sorted(routes.items()):
+            lines.append(f'http_request_errors_total{{{labels[key]}}} {errors}')
+        lines += ['# HELP http_request_duration_seconds HTTP request latency.',
+                  '# TYPE http_request_duration_seconds histogram']
+        for key, (_, _, histogram) in sorted(routes.items()):
+            cumulative = 0
+            for bound, n in zip(LATENCY_BUCKETS, histogram.counts):
+                cumulative += n
+                lines.append(f'http_request_duration_seconds_bucket{{{labels[key]},le="{bound:.6g}"}} {cumulative}')
+            lines.append(f'http_request_duration_seconds_bucket{{{labels[key]},le="+Inf"}} {histogram.count}')
+            lines.append(f'http_request_duration_seconds_sum{{{labels[key]}}} {histogram.sum:.6f}')
+            lines.append(f'http_request_duration_seconds_count{{{labels[key]}}} {histogram.count}')
+        lines += ['# HELP http_request_latency_seconds Estimated latency quantiles.',
+                  '# TYPE http_request_latency_seconds gauge']
+        for key, (_, _, histogram) in sorted(routes.items()):
+            for q in self.QUANTILES:
+                value = histogram.quantile(q)
+                if value is not None:
+                    lines.append(f'http_request_latency_seconds{{{labels[key]},quantile="{q}"}} {value:.6f}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape_label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+metrics = RouteMetrics()
+
+
+@app.before_request
+def _start_request_timer():
+    g.request_start = time.perf_counter()
+    metrics.start()
+
+
+@app.after_request
+def _remember_status(response):
+    g.response_status = response.status_code
+    return response
+
+
+@app.teardown_request
+def _record_request_metrics(exc):
+    # teardown 总会执行，保证并发数能正确回落；没有响应时按 500 计
+    start = g.pop('request_start', None)
+    if start is None:
+        return
+    rule = request.url_rule
+    metrics.finish(request.method, rule.rule if rule is not None else '<unmatched>',
+                   g.pop('response_status', 500), time.perf_counter() - start)
+
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus 格式的请求指标"""
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
 
 
 @app.route('/hello', methods=['GET'])
@@ -47,26 +1021,43 @@ def index():
 
 # ============= 新增API接口 1: 获取用户列表 =============
 @app.route('/users', methods=['GET'])
+@conditional_get(lambda: users_db.version)
 def get_users():
-    """获取所有用户列表"""
-    users_list = list(users_db.values())
-    return jsonify({
-        'success': True,
-        'data': users_list,
-        'total': len(users_list)
-    })
+    """获取用户列表，支持 email、age_min、age_max 过滤及 after/limit/stream 分页"""
+    email = request.args.get('email')
+    age_min = request.args.get('age_min', type=float)
+    age_max = request.args.get('age_max', type=float)
+    if _is_non_finite(age_min) or _is_non_finite(age_max):
+        return jsonify({
+            'success': False,
+            'message': '年龄范围必须是有限数值'
+        }), 400
+
+    if email is not None:
+        # 邮箱索引命中集合很小，直接在其上判断年龄
+        users_list = [u for u in map(users_db.get, sorted(user_index.find_by_email(email))) if u is not None]
+        if age_min is not None or age_max is not None:
+            users_list = [
+                u for u in users_list
+                if UserIndex._age_key(u) is not None
+                and (age_min is None or u['age'] >= age_min)
+                and (age_max is None or u['age'] <= age_max)
+            ]
+    elif age_min is not None or age_max is not None:
+        users_list = [u for u in map(users_db.get, user_index.find_by_age(age_min, age_max)) if u is not None]
+    else:
+        return _list_response(users_db, user_records)
+    return _records_response(user_records, users_list, total=len(users_list))
 
 
 # ============= 新增API接口 2: 获取单个用户 =============
 @app.route('/users/<int:user_id>', methods=['GET'])
+@conditional_get(lambda user_id: users_db.record_version(user_id))
 def get_user(user_id):
     """根据ID获取单个用户"""
     user = users_db.get(user_id)
     if user:
-        return jsonify({
-            'success': True,
-            'data': user
-        })
+        return Response(b'{"success":true,"data":%s}' % user_records.encode(user), mimetype='application/json')
     return jsonify({
         'success': False,
         'message': f'用户ID {user_id} 不存在'
@@ -77,7 +1068,6 @@ def get_user(user_id):
 @app.route('/users', methods=['POST'])
 def create_user():
     """创建新用户"""
-    global user_id_counter
     data = request.get_json()
     
     if not data:
@@ -94,15 +1084,22 @@ def create_user():
                 'success': False,
                 'message': f'缺少必填字段: {field}'
             }), 400
+    if not isinstance(data['email'], str):
+        return jsonify({
+            'success': False,
+            'message': '邮箱必须是字符串'
+        }), 400
+    if _is_non_finite(data.get('age')):
+        return jsonify({
+            'success': False,
+            'message': '年龄必须是有限数值'
+        }), 400
     
-    new_user = {
-        'id': user_id_counter,
+    new_user = users_db.create({
         'name': data['name'],
         'email': data['email'],
         'age': data.get('age', 0)
-    }
-    users_db[user_id_counter] = new_user
-    user_id_counter += 1
+    })
     
     return jsonify({
         'success': True,
@@ -128,13 +1125,23 @@ def update_user(user_id):
             'message': '请提供更新数据'
         }), 400
     
-    user = users_db[user_id]
-    if 'name' in data:
-        user['name'] = data['name']
-    if 'email' in data:
-        user['email'] = data['email']
-    if 'age' in data:
-        user['age'] = data['age']
+    changes = {field: data[field] for field in ('name', 'email', 'age') if field in data}
+    if not isinstance(changes.get('email', ''), str):
+        return jsonify({
+            'success': False,
+            'message': '邮箱必须是字符串'
+        }), 400
+    if _is_non_finite(changes.get('age')):
+        return jsonify({
+            'success': False,
+            'message': '年龄必须是有限数值'
+        }), 400
+    user = users_db.update(user_id, changes)
+    if user is None:
+        return jsonify({
+            'success': False,
+            'message': f'用户ID {user_id} 不存在'
+        }), 404
     
     return jsonify({
         'success': True,
@@ -147,13 +1154,13 @@ def update_user(user_id):
 @app.route('/users/<int:user_id>', methods=['DELETE'])
 def delete_user(user_id):
     """删除用户"""
-    if user_id not in users_db:
+    deleted_user = users_db.delete(user_id)
+    if deleted_user is None:
         return jsonify({
             'success': False,
             'message': f'用户ID {user_id} 不存在'
         }), 404
     
-    deleted_user = users_db.pop(user_id)
     return jsonify({
         'success': True,
         'message': '用户删除成功',
@@ -163,21 +1170,16 @@ def delete_user(user_id):
 
 # ============= 新增API接口 6: 获取产品列表 =============
 @app.route('/products', methods=['GET'])
+@conditional_get(lambda: products_db.version)
 def get_products():
-    """获取所有产品列表"""
-    products_list = list(products_db.values())
-    return jsonify({
-        'success': True,
-        'data': products_list,
-        'total': len(products_list)
-    })
+    """获取产品列表，支持 after/limit 游标分页及 stream 流式输出"""
+    return _list_response(products_db, product_records)
 
 
 # ============= 新增API接口 7: 创建产品 =============
 @app.route('/products', methods=['POST'])
 def create_product():
     """创建新产品"""
-    global product_id_counter
     data = request.get_json()
     
     if not data:
@@ -195,14 +1197,11 @@ def create_product():
                 'message': f'缺少必填字段: {field}'
             }), 400
     
-    new_product = {
-        'id': product_id_counter,
+    new_product = products_db.create({
         'name': data['name'],
         'price': float(data['price']),
         'stock': data.get('stock', 0)
-    }
-    products_db[product_id_counter] = new_product
-    product_id_counter += 1
+    })
     
     return jsonify({
         'success': True,
@@ -211,16 +1210,270 @@ def create_product():
     }), 201
 
 
+# ============= 批量导入：JSON 数组或 NDJSON =============
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonlines')
+
+
+def _read_batch_rows():
+    """读取批量请求体，返回可迭代的行；请求体无效时返回 None"""
+    if request.mimetype in NDJSON_MIMETYPES:
+        # request.stream 是无缓冲的原始流，按行读取前需加缓冲
+        return _iter_ndjson(io.BufferedReader(request.stream, 64 * 1024))
+    data = request.get_json(silent=True)
+    return data if isinstance(data, list) else None
+
+
+def _iter_ndjson(stream):
+    """逐行解析 NDJSON，不把整个请求体读入内存；无法解析的行返回 None"""
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+
+def _validate_user_row(row):
+    """校验一行用户数据，返回 (字段, 错误信息)；带 id 的行视为更新"""
+    if not isinstance(row, dict):
+        return None, '无效的用户数据'
+    if not isinstance(row.get('email', ''), str):
+        return None, '邮箱必须是字符串'
+    if _is_non_finite(row.get('age')):
+        return None, '年龄必须是有限数值'
+    if 'id' in row:
+        return {field: row[field] for field in ('name', 'email', 'age') if field in row}, None
+    for field in ('name', 'email'):
+        if field not in row:
+            return None, f'缺少必填字段: {field}'
+    return {'name': row['name'], 'email': row['email'], 'age': row.get('age', 0)}, None
+
+
+def _validate_product_row(row):
+    """校验一行产品数据，返回 (字段, 错误信息)；带 id 的行视为更新"""
+    if not isinstance(row, dict):
+        return None, '无效的产品数据'
+    if 'id' not in row:
+        for field in ('name', 'price'):
+            if field not in row:
+                return None, f'缺少必填字段: {field}'
+    fields = {field: row[field] for field in ('name', 'price', 'stock') if field in row}
+    if 'price' in fields:
+        try:
+            fields['price'] = float(fields['price'])
+        except (TypeError, ValueError):
+            return None, '无效的价格格式'
+    if 'id' not in row:
+        fields.setdefault('stock', 0)
+    return fields, None
+
+
+def _apply_batch(store, rows, validate, label):
+    """校验所有行，再一次性写入存储，返回逐行结果"""
+    results = []
+    creates = []  # (结果下标, 字段)
+    for row in rows:
+        fields, error = validate(row)
+        if error:
+            results.append({'index': len(results), 'success': False, 'message': error})
+        elif 'id' in row:
+            is_id = isinstance(row['id'], int) and not isinstance(row['id'], bool)
+            record = store.update(row['id'], fields) if is_id else None
+            if record is None:
+                results.append({'index': len(results), 'success': False,
+                                'message': f'{label}ID {row["id"]} 不存在'})
+            else:
+                results.append({'index': len(results), 'success': True, 'action': 'updated', 'data': record})
+        else:
+            creates.append((len(results), fields))
+            results.append(None)
+
+    for (pos, _), record in zip(creates, store.create_many([fields for _, fields in creates])):
+        results[pos] = {'index': pos, 'success': True, 'action': 'created', 'data': record}
+
+    failed = sum(1 for r in results if not r['success'])
+    return jsonify({
+        'success': failed == 0,
+        'data': results,
+        'created': len(creates),
+        'updated': len(results) - len(creates) - failed,
+        'failed': failed
+    })
+
+
+@app.route('/users/batch', methods=['POST'])
+def batch_users():
+    """批量创建/更新用户，请求体为 JSON 数组或 NDJSON"""
+    rows = _read_batch_rows()
+    if rows is None:
+        return jsonify({
+            'success': False,
+            'message': '请提供用户数据数组或NDJSON'
+        }), 400
+    return _apply_batch(users_db, rows, _validate_user_row, '用户')
+
+
+@app.route('/products/batch', methods=['POST'])
+def batch_products():
+    """批量创建/更新产品，请求体为 JSON 数组或 NDJSON"""
+    rows = _read_batch_rows()
+    if rows is None:
+        return jsonify({
+            'success': False,
+            'message': '请提供产品数据数组或NDJSON'
+        }), 400
+    return _apply_batch(products_db, rows, _validate_product_row, '产品')
+
+
+# ============= 库存预留/释放 =============
+class StockError(Exception):
+    """库存操作失败：产品不存在或库存不足"""
+
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def adjust_stock(items, sign):
+    """原子地调整多个产品的库存，全部成功或全部失败
+
+    items 为 {产品ID: 数量}，sign 为 -1（预留）或 1（释放）；库存永远不会变为负数。
+    预留数量累计在记录的 reserved 字段中，释放最多只能归还已预留的数量，
+    补货应通过更新产品的 stock 完成。
+    返回按产品ID排序的更新后产品列表，失败时抛出 StockError。
+    """
+    keys = sorted(items)
+
+    def compute(records):
+        changes = []
+        for key, record in zip(keys, records):
+            if record is None:
+                raise StockError(f'产品ID {key} 不存在', 404)
+            stock = record.get('stock')
+            if not isinstance(stock, int) or isinstance(stock, bool):
+                raise StockError(f'产品ID {key} 的库存数据无效', 409)
+            reserved = record.get('reserved', 0)
+            new_stock = stock + sign * items[key]
+            new_reserved = reserved - sign * items[key]
+            if new_stock < 0:
+                raise StockError(f'产品ID {key} 库存不足，当前库存: {stock}', 409)
+            if new_reserved < 0:
+                raise StockError(f'产品ID {key} 释放数量超过已预留数量，已预留: {reserved}', 409)
+            changes.append({'stock': new_stock, 'reserved': new_reserved})
+        return changes
+
+    return products_db.modify(keys, compute)
+
+
+def _request_quantity():
+    """从请求体 {"quantity": n} 读取数量，默认 1；无效时返回 None"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        data = {}
+    return _parse_quantity(data.get('quantity', 1))
+
+
+def _parse_quantity(value):
+    """数量必须是正整数，无效时返回 None"""
+    if isinstance(value, int) and not isinstance(value, bool) and value > 0:
+        return value
+    return None
+
+
+def _parse_stock_items(data):
+    """解析 {"items": [{"id": 1, "quantity": 2}, ...]}，同一产品的数量会合并"""
+    if not isinstance(data, dict) or not isinstance(data.get('items'), list) or not data['items']:
+        return None, '请提供 items 数组'
+    items = {}
+    for item in data['items']:
+        if (not isinstance(item, dict) or not isinstance(item.get('id'), int)
+                or isinstance(item['id'], bool)):
+            return None, '每一项都必须包含整数 id'
+        quantity = _parse_quantity(item.get('quantity', 1))
+        if quantity is None:
+            return None, f'产品ID {item["id"]} 的数量必须是正整数'
+        items[item['id']] = items.get(item['id'], 0) + quantity
+    return items, None
+
+
+def _stock_response(items, sign):
+    try:
+        products = adjust_stock(items, sign)
+    except StockError as e:
+        return jsonify({
+            'success': False,
+            'message': e.message
+        }), e.status_code
+    return jsonify({
+        'success': True,
+        'message': '库存预留成功' if sign < 0 else '库存释放成功',
+        'data': products
+    })
+
+
+@app.route('/products/<int:product_id>/reserve', methods=['POST'])
+def reserve_product(product_id):
+    """预留单个产品的库存，请求体 {"quantity": n}，默认 1"""
+    quantity = _request_quantity()
+    if quantity is None:
+        return jsonify({
+            'success': False,
+            'message': '数量必须是正整数'
+        }), 400
+    return _stock_response({product_id: quantity}, -1)
+
+
+@app.route('/products/<int:product_id>/release', methods=['POST'])
+def release_product(product_id):
+    """释放单个产品已预留的库存，请求体 {"quantity": n}，默认 1"""
+    quantity = _request_quantity()
+    if quantity is None:
+        return jsonify({
+            'success': False,
+            'message': '数量必须是正整数'
+        }), 400
+    return _stock_response({product_id: quantity}, 1)
+
+
+@app.route('/products/reserve', methods=['POST'])
+def reserve_products():
+    """批量预留库存：所有产品都有足够库存时才会全部扣减"""
+    items, error = _parse_stock_items(request.get_json(silent=True))
+    if error:
+        return jsonify({
+            'success': False,
+            'message': error
+        }), 400
+    return _stock_response(items, -1)
+
+
+@app.route('/products/release', methods=['POST'])
+def release_products():
+    """批量释放已预留的库存：任一产品释放数量超过已预留数量时全部不生效"""
+    items, error = _parse_stock_items(request.get_json(silent=True))
+    if error:
+        return jsonify({
+            'success': False,
+            'message': error
+        }), 400
+    return _stock_response(items, 1)
+
+
 # ============= 新增API接口 8: 健康检查接口 =============
 @app.route('/health', methods=['GET'])
+@conditional_get(lambda: int(time.time()))
 def health_check():
-    """健康检查接口，用于监控服务状态"""
+    """健康检查接口，用于监控服务状态；响应按秒缓存"""
     return jsonify({
         'success': True,
         'status': 'healthy',
         'service': 'Flask API',
         'version': '1.0.0',
-        'timestamp': datetime.now().isoformat()
+        'timestamp': datetime.now().replace(microsecond=0).isoformat(),
+        'metrics': metrics.summary()
     })
 
 
@@ -243,9 +1496,117 @@ def get_current_time():
 
 
 # ============= 新增API接口 10: 计算器接口 =============
+CALC_OPERATORS = {
+    'add': operator.add,
+    'subtract': operator.sub,
+    'multiply': operator.mul,
+    'divide': operator.truediv
+}
+CALC_OPERATION_CODES = {name: code for code, name in enumerate(CALC_OPERATORS)}
+UNSUPPORTED_OPERATION_HINT = '支持的运算符: add, subtract, multiply, divide'
+
+
+def _encode_operations(operations):
+    """把运算符数组编码为整数数组，不支持的运算符编码为 -1"""
+    try:
+        return np.fromiter(map(CALC_OPERATION_CODES.get, operations, itertools.repeat(-1)),
+                           dtype=np.int8, count=len(operations))
+    except TypeError:  # 数组中含有不可哈希的元素
+        return np.array([CALC_OPERATION_CODES.get(op, -1) if isinstance(op, str) else -1
+                         for op in operations], dtype=np.int8)
+
+
+def _invalid_number_positions(values):
+    """返回不是有限 JSON 数字（int/float，不含布尔值、NaN、Infinity）的元素位置"""
+    return [i for i, x in enumerate(values)
+            if type(x) not in (int, float) or (type(x) is float and not math.isfinite(x))]
+
+
+def _calculate_batch(num1, num2, operation):
+    """批量计算，返回 (结果列表, 除零位置列表, 溢出位置列表)；输入无效时抛出 ValueError
+
+    operation 可以是单个运算符（作用于所有元素）或与操作数等长的数组。
+    操作数必须是有限数字；除数为零或结果超出浮点范围的位置结果为 None。
+    """
+    count = len(num1)
+    if not isinstance(num2, list) or len(num2) != count:
+        raise ValueError('num1 与 num2 必须是等长数组')
+    if isinstance(operation, list):
+        if len(operation) != count:
+            raise ValueError('operation 数组长度必须与操作数一致')
+    elif not (isinstance(operation, str) and operation in CALC_OPERATORS):
+        raise ValueError(f'不支持的运算符: {operation}，{UNSUPPORTED_OPERATION_HINT}')
+    invalid = sorted(set(_invalid_number_positions(num1) + _invalid_number_positions(num2)))
+    if invalid:
+        raise ValueError(f'无效的数字格式，位置: {invalid[:10]}')
+    if np is None:
+        return _calculate_batch_python(num1, num2, operation)
+
+    try:
+        a = np.asarray(num1, dtype=float)
+        b = np.asarray(num2, dtype=float)
+    except OverflowError:  # 超出浮点范围的大整数
+        raise ValueError('数字超出范围')
+
+    with np.errstate(all='ignore'):
+        if isinstance(operation, list):
+            codes = _encode_operations(operation)
+            invalid = np.flatnonzero(codes < 0)
+            if invalid.size:
+                raise ValueError(f'不支持的运算符，位置: {invalid[:10].tolist()}，{UNSUPPORTED_OPERATION_HINT}')
+            result = np.empty(count)
+            for name, code in CALC_OPERATION_CODES.items():
+                mask = codes == code
+                if mask.any():
+                    result[mask] = getattr(np, name)(a[mask], b[mask])
+            zero_mask = (codes == CALC_OPERATION_CODES['divide']) & (b == 0)
+        else:
+            result = getattr(np, operation)(a, b)
+            zero_mask = b == 0 if operation == 'divide' else np.zeros(count, dtype=bool)
+
+    # 非有限结果（inf/NaN）不是合法 JSON，全部显式映射为 None
+    overflow_mask = ~np.isfinite(result) & ~zero_mask
+    results = result.tolist()
+    zero_positions = np.flatnonzero(zero_mask).tolist()
+    overflow_positions = np.flatnonzero(overflow_mask).tolist()
+    for i in itertools.chain(zero_positions, overflow_positions):
+        results[i] = None
+    return results, zero_positions, overflow_positions
+
+
+def _calculate_batch_python(num1, num2, operation):
+    """未安装 NumPy 时的逐元素实现，操作数已由 _calculate_batch 校验"""
+    operations = operation if isinstance(operation, list) else [operation] * len(num1)
+    invalid = [i for i, op in enumerate(operations) if not (isinstance(op, str) and op in CALC_OPERATORS)]
+    if invalid:
+        raise ValueError(f'不支持的运算符，位置: {invalid[:10]}，{UNSUPPORTED_OPERATION_HINT}')
+    results = []
+    zero_positions = []
+    overflow_positions = []
+    try:
+        for i, (x, y, op) in enumerate(zip(num1, num2, operations)):
+            x, y = float(x), float(y)
+            if op == 'divide' and y == 0:
+                zero_positions.append(i)
+                results.append(None)
+                continue
+            try:
+                result = CALC_OPERATORS[op](x, y)
+            except OverflowError:
+                result = math.inf
+            if math.isfinite(result):
+                results.append(result)
+            else:
+                overflow_positions.append(i)
+                results.append(None)
+    except OverflowError:  # 超出浮点范围的大整数
+        raise ValueError('数字超出范围')
+    return results, zero_positions, overflow_positions
+
+
 @app.route('/calculate', methods=['POST'])
 def calculate():
-    """计算器接口，支持加减乘除运算"""
+    """计算器接口，支持加减乘除运算；num1/num2 为数组时按批量模式计算"""
     data = request.get_json()
     
     if not data:
@@ -261,6 +1622,26 @@ def calculate():
                 'success': False,
                 'message': f'缺少必填字段: {field}'
             }), 400
+
+    if isinstance(data['num1'], list):
+        try:
+            results, zero_positions, overflow_positions = _calculate_batch(
+                data['num1'], data['num2'], data['operation'])
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': str(e)
+            }), 400
+        return jsonify({
+            'success': True,
+            'data': {
+                'operation': data['operation'] if isinstance(data['operation'], str) else 'mixed',
+                'results': results,
+                'division_by_zero': zero_positions,
+                'overflow': overflow_positions,
+                'count': len(results)
+            }
+        })
     
     try:
         num1 = float(data['num1'])
@@ -285,6 +1666,11 @@ def calculate():
                 'success': False,
                 'message': f'不支持的运算符: {operation}，支持的运算符: add, subtract, multiply, divide'
             }), 400
+        if not math.isfinite(result):
+            return jsonify({
+                'success': False,
+                'message': '计算结果超出数值范围'
+            }), 400
         
         return jsonify({
             'success': True,
@@ -295,7 +1681,7 @@ def calculate():
                 'result': result
             }
         })
-    except ValueError:
+    except (TypeError, ValueError, OverflowError):
         return jsonify({
             'success': False,
             'message': '无效的数字格式'
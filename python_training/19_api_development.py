@@ -17,29 +17,65 @@ print("API Development with Flask")
 basic_api_code = '''
 from flask import Flask, jsonify, request
 from datetime import datetime
+import itertools
+import sys
 
 app = Flask(__name__)
 
+class UserRepository:
+    """In-memory user store keyed by id
+
+    get/update/delete are O(1) dict operations, listing keeps insertion order,
+    and ids come from a monotonic sequence so they are never reused after a delete.
+    """
+
+    def __init__(self, users=()):
+        self._users = {user["id"]: user for user in users}
+        self._sequence = itertools.count(max(self._users, default=0) + 1)
+
+    def __len__(self):
+        return len(self._users)
+
+    def list(self):
+        return list(self._users.values())
+
+    def get(self, user_id):
+        return self._users.get(user_id)
+
+    def create(self, fields):
+        user = {"id": next(self._sequence), **fields}
+        self._users[user["id"]] = user
+        return user
+
+    def update(self, user_id, fields):
+        user = self._users.get(user_id)
+        if user is not None:
+            user.update(fields)
+        return user
+
+    def delete(self, user_id):
+        return self._users.pop(user_id, None)
+
 # Sample data store (in real applications, use a database)
-users = [
+users = UserRepository([
     {"id": 1, "name": "Alice", "email": "alice@example.com", "age": 28},
     {"id": 2, "name": "Bob", "email": "bob@example.com", "age": 32},
     {"id": 3, "name": "Charlie", "email": "charlie@example.com", "age": 25}
-]
+])
 
 # GET /users - Retrieve all users
 @app.route("/api/users", methods=["GET"])
 def get_users():
     return jsonify({
         "status": "success",
-        "data": users,
+        "data": users.list(),
         "count": len(users)
     })
 
 # GET /users/<id> - Retrieve a specific user
 @app.route("/api/users/<int:user_id>", methods=["GET"])
 def get_user(user_id):
-    user = next((u for u in users if u["id"] == user_id), None)
+    user = users.get(user_id)
     if user:
         return jsonify({
             "status": "success",
@@ -64,13 +100,11 @@ def create_user():
         }), 400
     
     # Create new user
-    new_user = {
-        "id": len(users) + 1,
+    new_user = users.create({
         "name": data["name"],
         "email": data["email"],
         "age": data.get("age", 0)
-    }
-    users.append(new_user)
+    })
     
     return jsonify({
         "status": "success",
@@ -81,7 +115,7 @@ def create_user():
 # PUT /users/<id> - Update a user
 @app.route("/api/users/<int:user_id>", methods=["PUT"])
 def update_user(user_id):
-    user = next((u for u in users if u["id"] == user_id), None)
+    user = users.get(user_id)
     if not user:
         return jsonify({
             "status": "error",
@@ -96,9 +130,9 @@ def update_user(user_id):
         }), 400
     
     # Update user fields
-    user["name"] = data.get("name", user["name"])
-    user["email"] = data.get("email", user["email"])
-    user["age"] = data.get("age", user["age"])
+    user = users.update(user_id, {
+        field: data[field] for field in ("name", "email", "age") if field in data
+    })
     
     return jsonify({
         "status": "success",
@@ -109,16 +143,12 @@ def update_user(user_id):
 # DELETE /users/<id> - Delete a user
 @app.route("/api/users/<int:user_id>", methods=["DELETE"])
 def delete_user(user_id):
-    global users
-    user = next((u for u in users if u["id"] == user_id), None)
-    if not user:
+    if users.delete(user_id) is None:
         return jsonify({
             "status": "error",
             "message": "User not found"
         }), 404
     
-    users = [u for u in users if u["id"] != user_id]
-    
     return jsonify({
         "status": "success",
         "message": "User deleted successfully"
@@ -140,8 +170,32 @@ def internal_error(error):
         "message": "Internal server error"
     }), 500
 
+def benchmark(sizes=(1_000, 10_000, 100_000, 1_000_000), operations=10_000):
+    """Show that get/update/delete latency stays flat as the repository grows"""
+    import random
+    import time
+
+    for size in sizes:
+        repo = UserRepository()
+        for i in range(size):
+            repo.create({"name": f"User {i}", "email": f"user{i}@example.com", "age": i % 80})
+        ids = random.sample(range(1, size + 1), min(operations, size))
+
+        timings = {}
+        for name, operation in [("get", repo.get),
+                                ("update", lambda user_id: repo.update(user_id, {"age": 30})),
+                                ("delete", repo.delete)]:
+            start = time.perf_counter()
+            for user_id in ids:
+                operation(user_id)
+            timings[name] = (time.perf_counter() - start) / len(ids) * 1e6
+        print(f"{size:>9,} users: " + ", ".join(f"{name} {us:.2f} us" for name, us in timings.items()))
+
 if __name__ == "__main__":
-    app.run(debug=True)
+    if "--benchmark" in sys.argv:
+        benchmark()
+    else:
+        app.run(debug=True)
 '''
 
 print("Basic REST API Structure:")
@@ -151,47 +205,132 @@ print(basic_api_code)
 validation_api_code = '''
 from flask import Flask, jsonify, request
 from functools import wraps
+import inspect
 import re
+import sys
 
 app = Flask(__name__)
 
-def validate_json(*expected_args):
-    """Decorator to validate JSON request"""
+# Compiled once at import; re.match(pattern_string, ...) pays a cache lookup per call
+EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+
+# JSON decoding only ever produces these exact types, so an identity check on
+# type() is enough (and rejects True/False where a number is expected)
+JSON_TYPES = {str: "is not str", int: "is not int", float: "not in number_types",
+              bool: "is not bool", list: "is not list", dict: "is not dict"}
+
+# min/max compare numbers and non_empty/pattern inspect strings; without an
+# explicit type the rules imply one, so they never run on a value they can't handle
+NUMBER_RULES = ("min", "max")
+STRING_RULES = ("non_empty", "pattern")
+
+def _field_type(name, spec):
+    """The type a field is checked against, or None when any value is accepted"""
+    has_number_rules = any(spec.get(rule) is not None for rule in NUMBER_RULES)
+    has_string_rules = any(spec.get(rule) not in (None, False) for rule in STRING_RULES)
+    kind = spec.get("type")
+    if kind is None:
+        if has_number_rules and has_string_rules:
+            raise ValueError(f"{name}: min/max and non_empty/pattern need an explicit type")
+        kind = float if has_number_rules else str if has_string_rules else None
+    elif (has_number_rules and kind not in (int, float)) or (has_string_rules and kind is not str):
+        raise ValueError(f"{name}: rules don't apply to type {kind.__name__}")
+    return kind
+
+def compile_schema(schema):
+    """Compile {"field": {"required", "type", "min", "max", "pattern", "non_empty"}} into a validator
+
+    The schema is turned into the source of one straight-line function, so a
+    request pays for a single pass with no per-rule loops or lookups. The
+    validator returns a dict of every error found, empty when the payload is valid.
+    Raises ValueError for a schema whose rules contradict its types.
+    """
+    # Builtins are bound as default arguments, which makes them fast local lookups
+    lines = ["def validate(data, type=type, str=str, int=int, float=float, bool=bool, list=list,",
+             "             dict=dict, number_types=(int, float)):",
+             "    errors = {}"]
+    constants = {}
+    for i, (name, spec) in enumerate(schema.items()):
+        checks = []
+        kind = _field_type(name, spec)
+        if kind is not None:
+            message = "must be a number" if kind is float else f"must be of type {kind.__name__}"
+            checks.append((f"type(value) {JSON_TYPES[kind]}", message))
+        if spec.get("non_empty"):
+            checks.append(("not value.strip()", "cannot be empty"))
+        if spec.get("min") is not None:
+            constants[f"min_{i}"] = spec["min"]
+            checks.append((f"value < min_{i}", f"must be >= {spec['min']}"))
+        if spec.get("max") is not None:
+            constants[f"max_{i}"] = spec["max"]
+            checks.append((f"value > max_{i}", f"must be <= {spec['max']}"))
+        if spec.get("pattern") is not None:
+            pattern = spec["pattern"]
+            constants[f"match_{i}"] = (re.compile(pattern) if isinstance(pattern, str) else pattern).match
+            checks.append((f"match_{i}(value) is None", spec.get("message", "has an invalid format")))
+
+        lines += ["    try:", f"        value = data[{name!r}]", "    except KeyError:"]
+        lines.append(f"        errors[{name!r}] = 'is required'" if spec.get("required") else "        pass")
+        if checks:
+            lines.append("    else:")
+            for j, (condition, message) in enumerate(checks):
+                keyword = "if" if j == 0 else "elif"
+                lines += [f"        {keyword} {condition}:", f"            errors[{name!r}] = {message!r}"]
+    lines.append("    return errors")
+
+    namespace = dict(constants)
+    exec("\\n".join(lines), namespace)
+    return namespace["validate"]
+
+def validate_json(*expected_args, schema=None):
+    """Decorator to validate a JSON request body against a schema
+
+    Positional names are shorthand for required fields. The schema is compiled
+    when the view is decorated. Views are called as before and can read
+    request.get_json() themselves; a view with a `data` parameter is passed
+    the already parsed body instead.
+    """
+    validate = compile_schema({**{name: {"required": True} for name in expected_args}, **(schema or {})})
+    # Every attribute access through the request proxy has a cost, so resolve it once per call
+    current_request = request._get_current_object
+
     def decorator(f):
+        wants_data = "data" in inspect.signature(f).parameters
+
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            if not request.is_json:
-                return jsonify({"error": "Content-Type must be application/json"}), 400
-            
-            json_data = request.get_json()
-            if not json_data:
+            req = current_request()
+            json_data = req.get_json(silent=True)
+            if type(json_data) is not dict or not json_data:
+                if not req.is_json:
+                    return jsonify({"error": "Content-Type must be application/json"}), 400
                 return jsonify({"error": "No JSON data provided"}), 400
             
-            for expected_arg in expected_args:
-                if expected_arg not in json_data:
-                    return jsonify({"error": f"Missing required field: {expected_arg}"}), 400
+            errors = validate(json_data)
+            if errors:
+                return jsonify({"error": "Validation failed", "fields": errors}), 400
             
-            return f(*args, **kwargs)
+            if not wants_data:
+                return f(*args, **kwargs)
+            if args or kwargs:
+                return f(*args, data=json_data, **kwargs)
+            return f(data=json_data)  # skips merging an empty kwargs dict, the common case
         return decorated_function
     return decorator
 
 def validate_email(email):
     """Simple email validation"""
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email) is not None
+    return EMAIL_RE.match(email) is not None
+
+USER_SCHEMA = {
+    "name": {"required": True, "type": str, "non_empty": True},
+    "email": {"required": True, "type": str, "pattern": EMAIL_RE, "message": "Invalid email format"},
+    "age": {"type": int, "min": 0, "max": 150},
+}
 
 @app.route("/api/users", methods=["POST"])
-@validate_json("name", "email")
-def create_user_validated():
-    data = request.get_json()
-    
-    # Additional validation
-    if not data["name"].strip():
-        return jsonify({"error": "Name cannot be empty"}), 400
-    
-    if not validate_email(data["email"]):
-        return jsonify({"error": "Invalid email format"}), 400
-    
+@validate_json(schema=USER_SCHEMA)
+def create_user_validated(data):
     # Check if email already exists
     # (In a real app, you'd check the database)
     
@@ -208,8 +347,64 @@ def create_user_validated():
         "data": user
     }), 201
 
+def benchmark(iterations=20_000, rounds=9):
+    """Compare the old per-request checks with the compiled schema validator
+
+    Rounds alternate between the two views so both see the same machine load;
+    the speedup is the median of the per-round ratios.
+    """
+    import statistics
+    import time
+
+    def legacy_validate_json(*expected_args):
+        def decorator(f):
+            @wraps(f)
+            def decorated_function(*args, **kwargs):
+                if not request.is_json:
+                    return jsonify({"error": "Content-Type must be application/json"}), 400
+                json_data = request.get_json()
+                if not json_data:
+                    return jsonify({"error": "No JSON data provided"}), 400
+                for expected_arg in expected_args:
+                    if expected_arg not in json_data:
+                        return jsonify({"error": f"Missing required field: {expected_arg}"}), 400
+                return f(*args, **kwargs)
+            return decorated_function
+        return decorator
+
+    @legacy_validate_json("name", "email")
+    def legacy_view():
+        data = request.get_json()
+        if not data["name"].strip():
+            return "empty name"
+        if not re.match(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$', data["email"]):
+            return "bad email"
+        return data
+
+    @validate_json(schema=USER_SCHEMA)
+    def compiled_view(data):
+        return data
+
+    def timed(view):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            view()
+        return time.perf_counter() - start
+
+    payload = {"name": "Alice", "email": "alice@example.com", "age": 28}
+    with app.test_request_context(json=payload):
+        legacy_view()  # parse the body once, as a real request would
+        rounds_timed = [(timed(legacy_view), timed(compiled_view)) for _ in range(rounds)]
+    for label, times in [("old decorator", [old for old, _ in rounds_timed]),
+                         ("compiled schema", [new for _, new in rounds_timed])]:
+        print(f"{label:>16}: {iterations / min(times):,.0f} validations/s")
+    print(f"speedup: {statistics.median(old / new for old, new in rounds_timed):.1f}x")
+
 if __name__ == "__main__":
-    app.run(debug=True)
+    if "--benchmark" in sys.argv:
+        benchmark()
+    else:
+        app.run(debug=True)
 '''
 
 print(f"\nAPI with Request Validation:")
@@ -219,16 +414,128 @@ print(validation_api_code)
 auth_api_code = '''
 from flask import Flask, jsonify, request
 from functools import wraps
+from collections import OrderedDict
 import base64
+import hashlib
+import hmac
+import logging
+import os
+import threading
 
 app = Flask(__name__)
+logger = logging.getLogger(__name__)
 
-# Simple API key storage (in real apps, use a database)
+# Demo keys, written to the key file as hashes the first time the app starts
 API_KEYS = {
     "sk-1234567890abcdef": "admin",
     "sk-0987654321fedcba": "user"
 }
 
+KEY_FILE = os.environ.get("API_KEY_FILE", "api_keys.txt")
+
+def hash_api_key(api_key):
+    """SHA-256 hex digest of a key; keys are long random strings, so no salt is needed"""
+    return hashlib.sha256(api_key.encode()).hexdigest()
+
+def write_key_file(path, keys):
+    """Write {api_key: role} as "<sha256> <role>" lines, replacing the file atomically"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        for api_key, role in keys.items():
+            f.write(f"{hash_api_key(api_key)} {role}\\n")
+    os.replace(tmp_path, path)
+
+class ApiKeyStore:
+    """Hashed API keys loaded from a file, with an LRU cache of verified digests
+
+    Only key hashes are kept, in the table and in the cache alike. A presented
+    key is hashed, its entry is found by the digest prefix, and the full digest
+    is compared with hmac.compare_digest.
+    A background thread watches the file's mtime and swaps in a freshly loaded
+    table, so requests never wait on a reload.
+    """
+
+    def __init__(self, path, cache_size=10_000, poll_interval=2.0):
+        self.path = path
+        self.cache_size = cache_size
+        self.poll_interval = poll_interval
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._stamp = None
+        self._keys = {}
+        self.reload()
+        self._stop = threading.Event()
+        self._watcher = threading.Thread(target=self._watch, name="api-key-reloader", daemon=True)
+        self._watcher.start()
+
+    def _file_stamp(self):
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self):
+        keys = {}
+        with open(self.path) as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                digest, role = line.split(None, 1)
+                # Index by a digest prefix so the secret-dependent part is compared in constant time
+                keys[digest[:16]] = (digest, role)
+        return keys
+
+    def reload(self):
+        """Load the key file if it changed; on error keep serving the old keys"""
+        try:
+            stamp = self._file_stamp()
+            if stamp == self._stamp:
+                return False
+            self._stamp = stamp  # a broken file is reported once, not on every poll
+            keys = self._load()
+        except (OSError, ValueError) as e:
+            logger.warning("API key reload from %s failed: %s", self.path, e)
+            return False
+        # Swap the table and drop the cache together: a revoked key stops working at once
+        with self._cache_lock:
+            self._keys = keys
+            self._cache = OrderedDict()
+        logger.info("Loaded %d API keys from %s", len(keys), self.path)
+        return True
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            self.reload()
+
+    def close(self):
+        self._stop.set()
+        self._watcher.join()
+
+    def verify(self, api_key):
+        """Return the role for api_key, or None if it is not a valid key"""
+        digest = hash_api_key(api_key)  # the plaintext key is never stored, not even in the cache
+        with self._cache_lock:
+            role = self._cache.get(digest)
+            if role is not None:
+                self._cache.move_to_end(digest)
+                return role
+            keys = self._keys
+
+        entry = keys.get(digest[:16])
+        if entry is None or not hmac.compare_digest(entry[0], digest):
+            return None
+
+        role = entry[1]
+        with self._cache_lock:
+            if self._keys is keys:  # don't cache a key checked against a table that was just replaced
+                self._cache[digest] = role
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return role
+
+if not os.path.exists(KEY_FILE):
+    write_key_file(KEY_FILE, API_KEYS)
+key_store = ApiKeyStore(KEY_FILE)
+
 def require_api_key(f):
     """Decorator to require API key authentication"""
     @wraps(f)
@@ -246,11 +553,12 @@ def require_api_key(f):
         except ValueError:
             return jsonify({"error": "Invalid authorization format"}), 401
         
-        if api_key not in API_KEYS:
+        role = key_store.verify(api_key)
+        if role is None:
             return jsonify({"error": "Invalid API key"}), 401
         
         # Add user info to request context
-        request.user_role = API_KEYS[api_key]
+        request.user_role = role
         return f(*args, **kwargs)
     
     return decorated_function
@@ -279,45 +587,215 @@ print(auth_api_code)
 # API with database integration
 db_api_code = '''
 from flask import Flask, jsonify, request
+from contextlib import contextmanager
+import base64
+import json
+import queue
 import sqlite3
+import sys
 
 app = Flask(__name__)
 
+DATABASE = "api_database.db"
+
 def get_db_connection():
-    conn = sqlite3.connect("api_database.db")
+    conn = sqlite3.connect(DATABASE)
     conn.row_factory = sqlite3.Row  # This allows us to access columns by name
     return conn
 
+class ConnectionPool:
+    """Fixed-size pool of SQLite connections with checkout semantics
+
+    Each connection is opened once with WAL journaling, tuned pragmas and a
+    larger prepared-statement cache, so a request only pays for a queue
+    get/put instead of connect + schema parse + a cold page cache.
+    """
+
+    def __init__(self, database, size=8, timeout=10):
+        self.database = database
+        self.timeout = timeout
+        # LIFO hands out the most recently used connection, whose page cache is warmest
+        self._pool = queue.LifoQueue(maxsize=size)
+        for _ in range(size):
+            self._pool.put(self._connect())
+
+    def _connect(self):
+        conn = sqlite3.connect(self.database, check_same_thread=False, cached_statements=256)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")      # readers don't block the writer
+        conn.execute("PRAGMA synchronous=NORMAL")    # safe with WAL, far fewer fsyncs
+        conn.execute("PRAGMA cache_size=-16000")     # 16 MB page cache per connection
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA mmap_size=268435456")   # 256 MB memory-mapped reads
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        conn = self._pool.get(timeout=self.timeout)
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()  # never hand out a connection with half a transaction
+            self._pool.put(conn)
+
+class UnpooledConnections:
+    """The old behaviour: open and close a connection per request (used by benchmark)"""
+
+    @contextmanager
+    def connection(self):
+        conn = get_db_connection()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+pool = ConnectionPool(DATABASE)
+
 def init_db():
     """Initialize the database"""
-    conn = get_db_connection()
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS products (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            price REAL NOT NULL,
-            description TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    with pool.connection() as conn:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS products (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                price REAL NOT NULL,
+                description TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        # Full-text index over name/description; "external content" means the
+        # text lives only in products and the triggers below keep the index in sync
+        fts_exists = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'products_fts'"
+        ).fetchone()
+        conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+                name, description,
+                content='products', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2',
+                prefix='2 3'
+            )
+        """)
+        conn.executescript("""
+            CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN
+                INSERT INTO products_fts (rowid, name, description)
+                VALUES (new.id, new.name, new.description);
+            END;
+            CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN
+                INSERT INTO products_fts (products_fts, rowid, name, description)
+                VALUES ('delete', old.id, old.name, old.description);
+            END;
+            CREATE TRIGGER IF NOT EXISTS products_fts_update AFTER UPDATE ON products BEGIN
+                INSERT INTO products_fts (products_fts, rowid, name, description)
+                VALUES ('delete', old.id, old.name, old.description);
+                INSERT INTO products_fts (rowid, name, description)
+                VALUES (new.id, new.name, new.description);
+            END;
+        """)
+        if not fts_exists:
+            # Index rows that were inserted before the FTS table existed
+            conn.execute("INSERT INTO products_fts (products_fts) VALUES ('rebuild')")
+        # Walked backwards this index yields rows newest first and seeks straight
+        # to a keyset cursor; the second one serves price-range listings
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_products_created_id_price "
+            "ON products (created_at, id, price)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_products_price_created "
+            "ON products (price, created_at, id)"
         )
-    """)
-    conn.commit()
-    conn.close()
+        conn.commit()
+
+def fts_query(text, column=None):
+    """Turn user input into a safe FTS5 prefix query: every term quoted and ending in *"""
+    terms = ['"' + term.replace('"', '""') + '"*' for term in text.split()]
+    if not terms:
+        return None
+    query = " AND ".join(terms)
+    return f"{column} : ({query})" if column else query
+
+def search_match(search=None, name_filter=None):
+    """Combined FTS5 query for the q= and name= parameters; "" when neither has terms"""
+    return " AND ".join(
+        f"({q})" for q in (fts_query(search or ""), fts_query(name_filter or "", "name")) if q
+    )
 
-@app.route("/api/products", methods=["GET"])
-def get_products():
-    conn = get_db_connection()
-    
-    # Support for query parameters
-    name_filter = request.args.get("name")
-    min_price = request.args.get("min_price", type=float)
-    max_price = request.args.get("max_price", type=float)
-    
-    query = "SELECT * FROM products WHERE 1=1"
+def encode_cursor(row, ranked=False):
+    """Opaque keyset cursor pointing just past row: (created_at, id), or (rank, id) for searches"""
+    key = json.dumps([row["rank"] if ranked else row["created_at"], row["id"]]).encode()
+    return base64.urlsafe_b64encode(key).decode()
+
+def decode_cursor(token, ranked=False):
+    """Return (created_at, id) or, for ranked searches, (rank, id) from a cursor token
+
+    Raises ValueError for malformed tokens and for a cursor from the other kind of listing.
+    """
+    try:
+        key, product_id = json.loads(base64.urlsafe_b64decode(token.encode()))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    key_type = (int, float) if ranked else str
+    if (not isinstance(key, key_type) or isinstance(key, bool)
+            or not isinstance(product_id, int) or isinstance(product_id, bool)):
+        raise ValueError("Invalid cursor")
+    return key, product_id
+
+# Price ranges with at most this many rows seek the price index and sort them;
+# wider ranges walk the created_at index instead (see build_products_query)
+PRICE_SEEK_MAX_ROWS = 2000
+
+def price_range_is_narrow(conn, min_price=None, max_price=None):
+    """True when at most PRICE_SEEK_MAX_ROWS products fall in the price range
+
+    Counts at most PRICE_SEEK_MAX_ROWS + 1 entries of the price index, so the
+    estimate itself is bounded no matter how wide the range is.
+    """
+    query = "SELECT COUNT(*) FROM (SELECT 1 FROM products INDEXED BY idx_products_price_created WHERE 1=1"
     params = []
-    
-    if name_filter:
-        query += " AND name LIKE ?"
-        params.append(f"%{name_filter}%")
+    if min_price is not None:
+        query += " AND price >= ?"
+        params.append(min_price)
+    if max_price is not None:
+        query += " AND price <= ?"
+        params.append(max_price)
+    query += " LIMIT ?)"
+    params.append(PRICE_SEEK_MAX_ROWS + 1)
+    return conn.execute(query, params).fetchone()[0] <= PRICE_SEEK_MAX_ROWS
+
+def build_products_query(search=None, name_filter=None, min_price=None, max_price=None,
+                         cursor=None, limit=50, narrow_price=True):
+    """Build the SQL and parameters for one page of products
+
+    narrow_price picks the index for price filters (see price_range_is_narrow).
+    """
+    match = search_match(search, name_filter)
+    if match:
+        # Ranked full-text search; bm25 puts the best matches first
+        query = """
+            SELECT products.*, products_fts.rank AS rank FROM products_fts
+            JOIN products ON products.id = products_fts.rowid
+            WHERE products_fts MATCH ?
+        """
+        params = [match]
+    elif (min_price is not None or max_price is not None) and narrow_price:
+        # Narrow range: seek it in the price index and sort its (at most
+        # PRICE_SEEK_MAX_ROWS) rows; walking created_at would skip past
+        # almost every row to find a few matches
+        query = "SELECT * FROM products INDEXED BY idx_products_price_created WHERE 1=1"
+        params = []
+    elif min_price is not None or max_price is not None:
+        # Wide range: walk created_at newest first from the cursor and test the
+        # price stored in the same index, stopping after LIMIT matches. No sort,
+        # but each page reads about limit / (share of rows in range) entries, and
+        # more if the matching prices cluster among old rows
+        query = "SELECT * FROM products INDEXED BY idx_products_created_id_price WHERE 1=1"
+        params = []
+    else:
+        query = "SELECT * FROM products WHERE 1=1"
+        params = []
     
     if min_price is not None:
         query += " AND price >= ?"
@@ -327,15 +805,57 @@ def get_products():
         query += " AND price <= ?"
         params.append(max_price)
     
-    query += " ORDER BY created_at DESC"
+    if match:
+        # Ranked pages continue after (rank, rowid); the id breaks ties between equal scores
+        if cursor is not None:
+            query += " AND (products_fts.rank, products_fts.rowid) > (?, ?)"
+            params.extend(cursor)
+        query += " ORDER BY products_fts.rank, products_fts.rowid LIMIT ?"
+    else:
+        # Keyset pagination: seek past the last row of the previous page instead
+        # of OFFSET, so page 1000 costs the same as page 1
+        if cursor is not None:
+            query += " AND (created_at, id) < (?, ?)"
+            params.extend(cursor)
+        query += " ORDER BY created_at DESC, id DESC LIMIT ?"
+    params.append(limit)
+    return query, params
+
+@app.route("/api/products", methods=["GET"])
+def get_products():
+    # Support for query parameters
+    search = request.args.get("q")
+    name_filter = request.args.get("name")
+    min_price = request.args.get("min_price", type=float)
+    max_price = request.args.get("max_price", type=float)
+    limit = max(1, min(request.args.get("limit", 50, type=int), 500))
+    ranked = bool(search_match(search, name_filter))  # whitespace-only q is not a search
+    cursor = None
+    if request.args.get("cursor"):
+        try:
+            cursor = decode_cursor(request.args["cursor"], ranked)
+        except ValueError as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
+    
+    with pool.connection() as conn:
+        narrow_price = ranked or price_range_is_narrow(conn, min_price, max_price)
+        query, params = build_products_query(search, name_filter, min_price, max_price, cursor, limit,
+                                             narrow_price)
+        products = conn.execute(query, params).fetchall()
     
-    products = conn.execute(query, params).fetchall()
-    conn.close()
+    next_cursor = None
+    if len(products) == limit:
+        next_cursor = encode_cursor(products[-1], ranked)
+    data = [dict(p) for p in products]
+    if ranked:
+        for product in data:
+            del product["rank"]  # only needed for the cursor
     
     return jsonify({
         "status": "success",
-        "data": [dict(p) for p in products],
-        "count": len(products)
+        "data": data,
+        "count": len(products),
+        "next_cursor": next_cursor
     })
 
 @app.route("/api/products", methods=["POST"])
@@ -348,17 +868,13 @@ def create_product():
             "message": "Name and price are required"
         }), 400
     
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        "INSERT INTO products (name, price, description) VALUES (?, ?, ?)",
-        (data["name"], data["price"], data.get("description", ""))
-    )
-    
-    product_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+    with pool.connection() as conn:
+        cursor = conn.execute(
+            "INSERT INTO products (name, price, description) VALUES (?, ?, ?)",
+            (data["name"], data["price"], data.get("description", ""))
+        )
+        product_id = cursor.lastrowid
+        conn.commit()
     
     return jsonify({
         "status": "success",
@@ -372,11 +888,10 @@ def create_product():
 
 @app.route("/api/products/<int:product_id>", methods=["GET"])
 def get_product(product_id):
-    conn = get_db_connection()
-    product = conn.execute(
-        "SELECT * FROM products WHERE id = ?", (product_id,)
-    ).fetchone()
-    conn.close()
+    with pool.connection() as conn:
+        product = conn.execute(
+            "SELECT * FROM products WHERE id = ?", (product_id,)
+        ).fetchone()
     
     if product:
         return jsonify({
@@ -389,9 +904,75 @@ def get_product(product_id):
             "message": "Product not found"
         }), 404
 
+def benchmark(requests_count=5000):
+    """Compare requests per second with per-request connections and with the pool"""
+    import time
+    global pool
+
+    init_db()
+    client = app.test_client()
+    for i in range(100):
+        client.post("/api/products", json={"name": f"Product {i}", "price": i})
+
+    pooled = pool
+    for label, backend in [("connect per request", UnpooledConnections()), ("connection pool", pooled)]:
+        pool = backend
+        start = time.perf_counter()
+        for i in range(requests_count):
+            client.get(f"/api/products/{i % 100 + 1}")
+        elapsed = time.perf_counter() - start
+        print(f"{label:>20}: {requests_count / elapsed:,.0f} requests/s")
+    pool = pooled
+
+def check_query_plans():
+    """Assert via EXPLAIN QUERY PLAN that every products query path is bounded
+
+    Narrow price ranges must seek the price index; they are the only listing
+    allowed to sort, and only their at most PRICE_SEEK_MAX_ROWS rows. Every
+    other listing must come out of idx_products_created_id_price already in
+    order: a cursor seeks into it, the first page walks it from the newest
+    row and LIMIT stops the walk.
+    """
+    init_db()
+    cursor = ("2024-01-01 00:00:00", 100)
+    ranked_cursor = (-1.5, 100)
+    cases = []
+    for search in (None, "lap"):
+        for min_price, max_price in [(None, None), (10.0, None), (None, 99.0), (10.0, 99.0)]:
+            for page in (None, ranked_cursor if search else cursor):
+                for narrow in ((True,) if search else (True, False)):
+                    cases.append(build_products_query(search, None, min_price, max_price, page,
+                                                      narrow_price=narrow))
+    cases.append(build_products_query(None, "lap", 10.0, 99.0))
+    
+    with pool.connection() as conn:
+        for query, params in cases:
+            plan = [row["detail"] for row in conn.execute("EXPLAIN QUERY PLAN " + query, params)]
+            searched = "MATCH" in query
+            price_seek = "INDEXED BY idx_products_price_created" in query
+            for step in plan:
+                if step.startswith("SCAN products "):
+                    assert step == "SCAN products USING INDEX idx_products_created_id_price" and not searched, \
+                        f"Unbounded scan in {query!r}: {plan}"
+                if not searched and not price_seek:
+                    assert "TEMP B-TREE" not in step, f"Sort not served by an index in {query!r}: {plan}"
+            if price_seek:
+                assert any(step.startswith("SEARCH products USING INDEX idx_products_price_created (price")
+                           for step in plan), f"Price range not seeked in {query!r}: {plan}"
+            elif not searched and "(created_at, id) <" in query:
+                assert any(step.startswith("SEARCH products USING INDEX idx_products_created_id_price (created_at")
+                           for step in plan), f"Cursor not seeked in {query!r}: {plan}"
+            print(f"ok  {' | '.join(plan)}")
+    print(f"{len(cases)} query paths checked, all bounded")
+
 if __name__ == "__main__":
     init_db()  # Initialize database
-    app.run(debug=True)
+    if "--benchmark" in sys.argv:
+        benchmark()
+    elif "--check-plans" in sys.argv:
+        check_query_plans()
+    else:
+        app.run(debug=True)
 '''
 
 print(f"\nAPI with Database Integration:")
@@ -400,50 +981,159 @@ print(db_api_code)
 # API with pagination
 pagination_api_code = '''
 from flask import Flask, jsonify, request
+from itertools import islice
+import base64
+import json
 import math
+import sqlite3
+import sys
+import threading
+import time
 
 app = Flask(__name__)
 
-# Sample large dataset
-large_dataset = [
-    {"id": i, "name": f"Item {i}", "value": i * 10}
-    for i in range(1, 1001)  # 1000 items
-]
+class GeneratorDataset:
+    """Dataset whose rows are produced on demand, never held in memory
+
+    items_after(key) must yield rows in ascending "id" order starting after
+    key, so a page only generates the rows it returns.
+    """
+
+    def __init__(self, items_after, count=None):
+        self.items_after = items_after
+        self._count = count
+
+    def fetch_after(self, key, limit):
+        return list(islice(self.items_after(key), limit))
+
+    def estimate_count(self):
+        return self._count() if self._count else None
+
+class SQLiteDataset:
+    """Dataset backed by a SQLite table, paged by seeking on its integer key"""
+
+    def __init__(self, database, table, key="id"):
+        self.conn = sqlite3.connect(database, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.table = table
+        self.key = key
+        self._lock = threading.Lock()
+
+    def fetch_after(self, key, limit):
+        # Index seek on the key: page 1,000,000 costs the same as page 1
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT * FROM {self.table} WHERE {self.key} > ? ORDER BY {self.key} LIMIT ?",
+                (key, limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def estimate_count(self):
+        # min/max on the key are two index lookups; COUNT(*) would read every row
+        with self._lock:
+            low, high = self.conn.execute(
+                f"SELECT MIN({self.key}), MAX({self.key}) FROM {self.table}"
+            ).fetchone()
+        return 0 if low is None else high - low + 1
+
+class CountCache:
+    """Approximate totals per dataset, refreshed at most once every ttl seconds"""
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def get(self, name, dataset):
+        now = time.monotonic()
+        with self._lock:
+            cached = self._counts.get(name)
+        if cached and now - cached[1] < self.ttl:
+            return cached[0]
+        count = dataset.estimate_count()
+        with self._lock:
+            self._counts[name] = (count, now)
+        return count
+
+def encode_cursor(key):
+    """Opaque cursor token for the rows that follow key"""
+    return base64.urlsafe_b64encode(json.dumps({"after": key}).encode()).decode().rstrip("=")
+
+def decode_cursor(token):
+    """Return the key encoded in a cursor token, or raise ValueError"""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        key = json.loads(base64.urlsafe_b64decode(padded.encode()))["after"]
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(key, int) or isinstance(key, bool) or key < 0:
+        raise ValueError("Invalid cursor")
+    return key
+
+# Sample large dataset: 50M virtual items, generated lazily from their id
+DATASET_SIZE = 50_000_000
+
+def generate_items(after):
+    for i in range(after + 1, DATASET_SIZE + 1):
+        yield {"id": i, "name": f"Item {i}", "value": i * 10}
+
+large_dataset = GeneratorDataset(generate_items, count=lambda: DATASET_SIZE)
+counts = CountCache()
 
 @app.route("/api/items", methods=["GET"])
 def get_items_paginated():
     # Get pagination parameters
-    page = request.args.get("page", 1, type=int)
     per_page = request.args.get("per_page", 10, type=int)
     
     # Limit per_page to prevent abuse
-    per_page = min(per_page, 100)
+    per_page = max(1, min(per_page, 100))
     
-    # Calculate offset
-    offset = (page - 1) * per_page
+    try:
+        after = decode_cursor(request.args["cursor"]) if request.args.get("cursor") else 0
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
     
-    # Get items for current page
-    items = large_dataset[offset:offset + per_page]
+    # Fetch one extra row to learn whether another page exists
+    items = large_dataset.fetch_after(after, per_page + 1)
+    has_next = len(items) > per_page
+    items = items[:per_page]
     
-    # Calculate pagination info
-    total_items = len(large_dataset)
-    total_pages = math.ceil(total_items / per_page)
+    # Calculate pagination info from the cached, approximate total
+    total_items = counts.get("items", large_dataset)
     
     return jsonify({
         "status": "success",
         "data": items,
         "pagination": {
-            "current_page": page,
             "per_page": per_page,
+            "next_cursor": encode_cursor(items[-1]["id"]) if has_next else None,
+            "has_next": has_next,
+            "has_prev": after > 0,
             "total_items": total_items,
-            "total_pages": total_pages,
-            "has_next": page < total_pages,
-            "has_prev": page > 1
+            "total_pages": math.ceil(total_items / per_page) if total_items is not None else None,
+            "total_is_estimate": True
         }
     })
 
+def benchmark(repeat=2000):
+    """Show that a deep page costs the same as the first one"""
+    import tracemalloc
+    client = app.test_client()
+    tracemalloc.start()
+    for label, after in [("page 1", 0), ("page 4,000,000", 40_000_000)]:
+        url = f"/api/items?per_page=10&cursor={encode_cursor(after)}"
+        start = time.perf_counter()
+        for _ in range(repeat):
+            client.get(url)
+        elapsed = time.perf_counter() - start
+        print(f"{label:>15}: {elapsed / repeat * 1e6:,.0f} us per request")
+    print(f"peak traced memory: {tracemalloc.get_traced_memory()[1] / 1024:,.0f} KiB")
+
 if __name__ == "__main__":
-    app.run(debug=True)
+    if "--benchmark" in sys.argv:
+        benchmark()
+    else:
+        app.run(debug=True)
 '''
 
 print(f"\nAPI with Pagination:")
@@ -453,40 +1143,131 @@ print(pagination_api_code)
 rate_limiting_code = '''
 from flask import Flask, jsonify, request
 from functools import wraps
+from collections import OrderedDict
 from time import time
+import math
+import sqlite3
+import threading
 
 app = Flask(__name__)
 
-# Simple rate limiting store (in real apps, use Redis)
-rate_limits = {}
-
-def rate_limit(max_requests=10, window=60):
-    """Rate limiting decorator"""
+def advance_window(state, now, window):
+    """Roll (window_start, current, previous) forward to the window containing now"""
+    window_start, current, previous = state
+    start = now - now % window
+    if start == window_start:
+        return state
+    if start - window_start == window:
+        return (start, 0, current)
+    return (start, 0, 0)
+
+def check_window(state, now, max_requests, window):
+    """Sliding-window-counter check: return (allowed, retry_after, new_state)
+
+    The previous fixed window's count is weighted by how much of it still
+    overlaps the sliding window, so every check is O(1) in time and memory.
+    """
+    window_start, current, previous = advance_window(state, now, window)
+    elapsed = now - window_start
+    estimated = previous * (1 - elapsed / window) + current
+    if estimated + 1 > max_requests:
+        if previous and current < max_requests:
+            # Wait until the previous window's weight has decayed enough
+            wait = (1 - (max_requests - 1 - current) / previous) * window - elapsed
+        else:
+            # The current window becomes the previous one and then has to decay
+            wait = window - elapsed + (1 - (max_requests - 1) / current) * window
+        return False, max(1, math.ceil(wait)), (window_start, current, previous)
+    return True, 0, (window_start, current + 1, previous)
+
+class SlidingWindowLimiter:
+    """In-process limiter; idle clients are evicted LRU-style beyond max_clients"""
+
+    def __init__(self, max_requests, window, max_clients=10000):
+        self.max_requests = max_requests
+        self.window = window
+        self.max_clients = max_clients
+        self._clients = OrderedDict()  # key -> (window_start, current, previous)
+        self._lock = threading.Lock()
+
+    def hit(self, key):
+        now = time()
+        with self._lock:
+            state = self._clients.pop(key, (0, 0, 0))
+            allowed, retry_after, state = check_window(state, now, self.max_requests, self.window)
+            self._clients[key] = state  # re-insert as most recently used
+            if len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+        return allowed, retry_after
+
+class SQLiteWindowLimiter:
+    """Same algorithm with state in SQLite, so several worker processes share one limit"""
+
+    def __init__(self, max_requests, window, db_path="rate_limits.db", cleanup_every=1000):
+        self.max_requests = max_requests
+        self.window = window
+        self.db_path = db_path
+        self.cleanup_every = cleanup_every
+        self._local = threading.local()
+        self._hits = 0
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS rate_limits (
+                key TEXT PRIMARY KEY,
+                window_start REAL NOT NULL,
+                current INTEGER NOT NULL,
+                previous INTEGER NOT NULL
+            )
+        """)
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def hit(self, key):
+        now = time()
+        conn = self._connection()
+        # BEGIN IMMEDIATE takes the write lock up front, making read-check-write atomic across processes
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT window_start, current, previous FROM rate_limits WHERE key = ?", (key,)
+            ).fetchone()
+            allowed, retry_after, state = check_window(row or (0, 0, 0), now, self.max_requests, self.window)
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_limits (key, window_start, current, previous) VALUES (?, ?, ?, ?)",
+                (key, *state)
+            )
+            self._hits += 1
+            if self._hits % self.cleanup_every == 0:
+                # Clients idle for two windows carry no state worth keeping
+                conn.execute("DELETE FROM rate_limits WHERE window_start < ?", (now - 2 * self.window,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return allowed, retry_after
+
+def rate_limit(max_requests=10, window=60, db_path=None):
+    """Rate limiting decorator; pass db_path to share the limit between worker processes"""
     def decorator(f):
+        if db_path:
+            limiter = SQLiteWindowLimiter(max_requests, window, db_path)
+        else:
+            limiter = SlidingWindowLimiter(max_requests, window)
+
         @wraps(f)
         def decorated_function(*args, **kwargs):
-            client_ip = request.remote_addr
-            current_time = time()
-            
-            # Initialize client record if not exists
-            if client_ip not in rate_limits:
-                rate_limits[client_ip] = []
-            
-            # Remove old requests outside the window
-            rate_limits[client_ip] = [
-                req_time for req_time in rate_limits[client_ip]
-                if current_time - req_time < window
-            ]
-            
-            # Check if limit exceeded
-            if len(rate_limits[client_ip]) >= max_requests:
+            allowed, retry_after = limiter.hit(f"{f.__name__}:{request.remote_addr}")
+            if not allowed:
                 return jsonify({
                     "error": "Rate limit exceeded",
-                    "retry_after": window
-                }), 429
-            
-            # Add current request
-            rate_limits[client_ip].append(current_time)
+                    "retry_after": retry_after
+                }), 429, {"Retry-After": str(retry_after)}
             
             return f(*args, **kwargs)
         return decorated_function
@@ -500,6 +1281,14 @@ def get_data():
         "timestamp": time()
     })
 
+@app.route("/api/shared-data", methods=["GET"])
+@rate_limit(max_requests=100, window=60, db_path="rate_limits.db")  # shared by all workers
+def get_shared_data():
+    return jsonify({
+        "message": "Data retrieved successfully",
+        "timestamp": time()
+    })
+
 if __name__ == "__main__":
     app.run(debug=True)
 '''
@@ -511,24 +1300,133 @@ print(rate_limiting_code)
 error_handling_code = '''
 from flask import Flask, jsonify, request
 from werkzeug.exceptions import HTTPException
+from collections import OrderedDict
+import hashlib
+import threading
+import time
 import traceback
 
 app = Flask(__name__)
 
+class ErrorAggregator:
+    """Groups exceptions by fingerprint and logs only a sample of full tracebacks
+
+    A fingerprint is the exception type plus the frame that raised it, read
+    straight off the traceback without formatting anything. Each fingerprint
+    logs at most samples_per_window full tracebacks per window; later
+    occurrences only bump a counter. The table holds max_fingerprints entries
+    and evicts the least recently seen.
+    """
+
+    def __init__(self, logger, window=60, samples_per_window=3, max_fingerprints=1000, keep_samples=5):
+        self.logger = logger
+        self.window = window
+        self.samples_per_window = samples_per_window
+        self.max_fingerprints = max_fingerprints
+        self.keep_samples = keep_samples
+        self.evicted = 0
+        self._table = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def fingerprint(e):
+        tb = e.__traceback__
+        if tb is None:
+            return (f"{type(e).__module__}.{type(e).__qualname__}", "", "", 0)
+        while tb.tb_next is not None:
+            tb = tb.tb_next
+        code = tb.tb_frame.f_code
+        return (f"{type(e).__module__}.{type(e).__qualname__}", code.co_filename, code.co_name, tb.tb_lineno)
+
+    def record(self, e):
+        key = self.fingerprint(e)
+        now = time.time()
+        with self._lock:
+            entry = self._table.get(key)
+            if entry is None:
+                entry = {
+                    "id": hashlib.sha1(repr(key).encode()).hexdigest()[:12],
+                    "type": key[0],
+                    "location": f"{key[1]}:{key[3]} in {key[2]}",
+                    "count": 0,
+                    "first_seen": now,
+                    "window_start": now,
+                    "window_count": 0,
+                    "suppressed": 0,
+                    "samples": [],
+                }
+                self._table[key] = entry
+                if len(self._table) > self.max_fingerprints:
+                    self._table.popitem(last=False)
+                    self.evicted += 1
+            else:
+                self._table.move_to_end(key)
+            
+            previous_suppressed = 0
+            if now - entry["window_start"] >= self.window:
+                previous_suppressed = entry["window_count"] - min(entry["window_count"], self.samples_per_window)
+                entry["window_start"] = now
+                entry["window_count"] = 0
+            entry["count"] += 1
+            entry["window_count"] += 1
+            entry["last_seen"] = now
+            entry["message"] = str(e)
+            sample = entry["window_count"] <= self.samples_per_window
+            if not sample:
+                entry["suppressed"] += 1
+        
+        if previous_suppressed:
+            self.logger.error(f"[{entry['id']}] {entry['type']} repeated {previous_suppressed} more times "
+                              f"in the last {self.window}s window (tracebacks suppressed)")
+        if sample:
+            # Only sampled occurrences pay for formatting and logging a traceback
+            formatted = "".join(traceback.format_exception(type(e), e, e.__traceback__))
+            self.logger.error(f"[{entry['id']}] Unhandled exception: {e}\\n{formatted}")
+            with self._lock:
+                entry["samples"] = (entry["samples"] + [formatted])[-self.keep_samples:]
+        return entry["id"]
+
+    def snapshot(self):
+        """The table as plain dicts, most frequent first"""
+        with self._lock:
+            entries = [dict(entry, samples=list(entry["samples"])) for entry in self._table.values()]
+        for entry in entries:
+            del entry["window_start"], entry["window_count"]
+        return sorted(entries, key=lambda entry: entry["count"], reverse=True)
+
+errors = ErrorAggregator(app.logger)
+
 @app.errorhandler(Exception)
 def handle_exception(e):
     """Generic error handler"""
-    # Log the error
-    app.logger.error(f"Unhandled exception: {str(e)}")
-    app.logger.error(traceback.format_exc())
+    # HTTP errors (405, 413, ...) keep their own status code and aren't crashes
+    if isinstance(e, HTTPException):
+        return e
+    
+    # Count the error; only a sample of tracebacks is formatted and logged
+    error_id = errors.record(e)
     
     # Return JSON error response
     return jsonify({
         "status": "error",
         "message": "An internal error occurred",
-        "error_type": type(e).__name__
+        "error_type": type(e).__name__,
+        "error_id": error_id
     }), 500
 
+@app.route("/debug/errors", methods=["GET"])
+def debug_errors():
+    """Aggregated error table; only served to local requests"""
+    if request.remote_addr not in ("127.0.0.1", "::1"):
+        return not_found(None)
+    table = errors.snapshot()
+    return jsonify({
+        "status": "success",
+        "data": table,
+        "fingerprints": len(table),
+        "evicted": errors.evicted
+    })
+
 @app.errorhandler(400)
 def bad_request(e):
     return jsonify({
@@ -574,6 +1472,11 @@ def test_error():
     # Example of raising custom API error
     raise APIError("This is a test API error", 400, "TEST_ERROR")
 
+@app.route("/api/test-crash", methods=["GET"])
+def test_crash():
+    # Example of an unexpected error reaching handle_exception
+    return jsonify({"result": 1 / int(request.args.get("divisor", 0))})
+
 if __name__ == "__main__":
     app.run(debug=True)
 '''
@@ -585,25 +1488,105 @@ print(error_handling_code)
 task_api_code = '''
 from flask import Flask, jsonify, request
 from datetime import datetime
+import itertools
 import uuid
 
 app = Flask(__name__)
 
+class TaskStore:
+    """In-memory tasks keyed by UUID, with inverted indexes on the filterable fields
+
+    Each indexed field maps a value to the set of task ids holding it. The
+    sets are kept in step on create/update/delete, so a filter only touches
+    the matching ids instead of every task.
+    """
+
+    INDEXED_FIELDS = ("status", "priority")
+
+    def __init__(self):
+        self._tasks = {}
+        self._order = {}  # task id -> creation sequence, to list matches in creation order
+        self._sequence = itertools.count()
+        self._indexes = {field: {} for field in self.INDEXED_FIELDS}
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def _index(self, task):
+        for field, index in self._indexes.items():
+            index.setdefault(task[field], set()).add(task["id"])
+
+    def _unindex(self, task):
+        for field, index in self._indexes.items():
+            ids = index.get(task[field])
+            if ids is not None:
+                ids.discard(task["id"])
+                if not ids:
+                    del index[task[field]]
+
+    def get(self, task_id):
+        return self._tasks.get(task_id)
+
+    def create(self, task):
+        self._tasks[task["id"]] = task
+        self._order[task["id"]] = next(self._sequence)
+        self._index(task)
+        return task
+
+    def update(self, task_id, fields):
+        task = self._tasks.get(task_id)
+        if task is None:
+            return None
+        reindex = any(field in fields and fields[field] != task[field] for field in self._indexes)
+        if reindex:
+            self._unindex(task)
+        task.update(fields)
+        if reindex:
+            self._index(task)
+        return task
+
+    def delete(self, task_id):
+        task = self._tasks.pop(task_id, None)
+        if task is not None:
+            del self._order[task_id]
+            self._unindex(task)
+        return task
+
+    def filter(self, **criteria):
+        """Tasks whose indexed fields equal every given value, in creation order"""
+        criteria = {field: value for field, value in criteria.items() if value}
+        if not criteria:
+            return list(self._tasks.values())
+        
+        # Intersect starting from the smallest set so every step stays small
+        matches = sorted((self._indexes[field].get(value, set()) for field, value in criteria.items()), key=len)
+        ids = matches[0]
+        for other in matches[1:]:
+            if not ids:
+                break
+            ids = ids & other
+        return [self._tasks[task_id] for task_id in sorted(ids, key=self._order.__getitem__)]
+
 # In-memory storage for tasks (use database in real app)
-tasks = []
+tasks = TaskStore()
+
+def invalid_indexed_field(data):
+    """First indexed field in data whose value isn't a string, or None
+
+    Checked before the store is touched: an unhashable value would fail
+    half-way through re-indexing and leave the task out of the indexes.
+    """
+    for field in TaskStore.INDEXED_FIELDS:
+        if field in data and not isinstance(data[field], str):
+            return field
+    return None
 
 @app.route("/api/tasks", methods=["GET"])
 def get_tasks():
-    status_filter = request.args.get("status")
-    priority_filter = request.args.get("priority")
-    
-    filtered_tasks = tasks
-    
-    if status_filter:
-        filtered_tasks = [t for t in filtered_tasks if t["status"] == status_filter]
-    
-    if priority_filter:
-        filtered_tasks = [t for t in filtered_tasks if t["priority"] == priority_filter]
+    filtered_tasks = tasks.filter(
+        status=request.args.get("status"),
+        priority=request.args.get("priority")
+    )
     
     return jsonify({
         "status": "success",
@@ -623,7 +1606,14 @@ def create_task():
                 "message": f"{field} is required"
             }), 400
     
-    new_task = {
+    field = invalid_indexed_field(data)
+    if field:
+        return jsonify({
+            "status": "error",
+            "message": f"{field} must be a string"
+        }), 400
+    
+    new_task = tasks.create({
         "id": str(uuid.uuid4()),
         "title": data["title"],
         "description": data["description"],
@@ -631,9 +1621,7 @@ def create_task():
         "priority": data.get("priority", "medium"),
         "created_at": datetime.now().isoformat(),
         "updated_at": datetime.now().isoformat()
-    }
-    
-    tasks.append(new_task)
+    })
     
     return jsonify({
         "status": "success",
@@ -642,8 +1630,7 @@ def create_task():
 
 @app.route("/api/tasks/<task_id>", methods=["PUT"])
 def update_task(task_id):
-    task = next((t for t in tasks if t["id"] == task_id), None)
-    if not task:
+    if tasks.get(task_id) is None:
         return jsonify({
             "status": "error",
             "message": "Task not found"
@@ -653,11 +1640,15 @@ def update_task(task_id):
     
     # Update allowed fields
     updatable_fields = ["title", "description", "status", "priority"]
-    for field in updatable_fields:
-        if field in data:
-            task[field] = data[field]
-    
-    task["updated_at"] = datetime.now().isoformat()
+    changes = {field: data[field] for field in updatable_fields if field in data}
+    field = invalid_indexed_field(changes)
+    if field:
+        return jsonify({
+            "status": "error",
+            "message": f"{field} must be a string"
+        }), 400
+    changes["updated_at"] = datetime.now().isoformat()
+    task = tasks.update(task_id, changes)
     
     return jsonify({
         "status": "success",
@@ -666,11 +1657,7 @@ def update_task(task_id):
 
 @app.route("/api/tasks/<task_id>", methods=["DELETE"])
 def delete_task(task_id):
-    global tasks
-    initial_count = len(tasks)
-    tasks = [t for t in tasks if t["id"] != task_id]
-    
-    if len(tasks) == initial_count:
+    if tasks.delete(task_id) is None:
         return jsonify({
             "status": "error",
             "message": "Task not found"
@@ -16,7 +16,20 @@ print("Project Integration - Combining Python Concepts")
 import requests
 import sqlite3
 import json
-from datetime import datetime
+import csv
+import gzip
+import hashlib
+import io
+import math
+import queue
+import struct
+from array import array
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
 from flask import Flask, render_template, request, jsonify
 import os
 
@@ -30,6 +43,58 @@ import os
 
 print("\nStep 1: Setting up the database")
 
+class RunningStats:
+    """Count, mean, variance, min and max of a stream, updated in O(1) per value
+
+    Uses Welford's algorithm: the running mean and the sum of squared
+    differences from it (m2) are updated per value, which stays numerically
+    stable where sum / sum-of-squares would lose precision.
+    """
+
+    __slots__ = ("count", "mean", "m2", "min", "max")
+
+    def __init__(self, count=0, mean=0.0, m2=0.0, min=None, max=None):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+        self.min = min
+        self.max = max
+
+    def update(self, value):
+        if value is None:
+            return
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = value if self.min is None or value < self.min else self.min
+        self.max = value if self.max is None or value > self.max else self.max
+
+    @property
+    def variance(self):
+        """Sample variance (None until there are two values)"""
+        return self.m2 / (self.count - 1) if self.count > 1 else None
+
+    def to_dict(self):
+        variance = self.variance
+        return {
+            "count": self.count,
+            "mean": self.mean if self.count else None,
+            "variance": variance,
+            "stddev": variance ** 0.5 if variance is not None else None,
+            "min": self.min,
+            "max": self.max,
+        }
+
+# Metrics tracked per city, mapped to their weather_history column
+STATS_METRICS = ("temperature", "humidity")
+
+# Rollup table -> strftime() format that truncates a timestamp to its bucket
+ROLLUP_TABLES = {
+    "weather_hourly": "%Y-%m-%d %H:00:00",
+    "weather_daily": "%Y-%m-%d",
+}
+
 # Create database and tables
 def setup_database():
     """Set up the database for weather tracking"""
@@ -48,6 +113,112 @@ def setup_database():
         )
     ''')
     
+    # (city, timestamp) serves per-city history newest first; timestamp alone serves all cities
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_weather_city_time ON weather_history (city, timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_weather_time ON weather_history (timestamp)")
+    
+    # Hourly and daily rollups, kept up to date by an insert trigger so long-range
+    # queries read a few hundred buckets instead of every raw reading
+    for table, bucket_format in ROLLUP_TABLES.items():
+        exists = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        ).fetchone()
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                city TEXT NOT NULL,
+                bucket TEXT NOT NULL,
+                readings INTEGER NOT NULL,
+                temp_count INTEGER NOT NULL,
+                temp_sum REAL,
+                temp_min REAL,
+                temp_max REAL,
+                humidity_count INTEGER NOT NULL,
+                humidity_sum REAL,
+                humidity_min INTEGER,
+                humidity_max INTEGER,
+                PRIMARY KEY (city, bucket)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_bucket ON {table} (bucket)")
+        # min()/max() with a NULL argument return NULL, hence the coalesce fallbacks
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_on_insert AFTER INSERT ON weather_history BEGIN
+                INSERT INTO {table} VALUES (
+                    new.city, strftime('{bucket_format}', new.timestamp), 1,
+                    new.temperature IS NOT NULL, new.temperature, new.temperature, new.temperature,
+                    new.humidity IS NOT NULL, new.humidity, new.humidity, new.humidity
+                )
+                ON CONFLICT (city, bucket) DO UPDATE SET
+                    readings = readings + 1,
+                    temp_count = temp_count + excluded.temp_count,
+                    temp_sum = coalesce(temp_sum + excluded.temp_sum, temp_sum, excluded.temp_sum),
+                    temp_min = coalesce(min(temp_min, excluded.temp_min), temp_min, excluded.temp_min),
+                    temp_max = coalesce(max(temp_max, excluded.temp_max), temp_max, excluded.temp_max),
+                    humidity_count = humidity_count + excluded.humidity_count,
+                    humidity_sum = coalesce(humidity_sum + excluded.humidity_sum, humidity_sum, excluded.humidity_sum),
+                    humidity_min = coalesce(min(humidity_min, excluded.humidity_min), humidity_min, excluded.humidity_min),
+                    humidity_max = coalesce(max(humidity_max, excluded.humidity_max), humidity_max, excluded.humidity_max);
+            END
+        ''')
+        if not exists:
+            # Backfill readings stored before the rollup table existed
+            cursor.execute(f'''
+                INSERT INTO {table}
+                SELECT city, strftime('{bucket_format}', timestamp), COUNT(*),
+                       COUNT(temperature), SUM(temperature), MIN(temperature), MAX(temperature),
+                       COUNT(humidity), SUM(humidity), MIN(humidity), MAX(humidity)
+                FROM weather_history
+                GROUP BY 1, 2
+            ''')
+
+    # Running per-city statistics, persisted so they survive restarts without a rescan
+    stats_exist = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'weather_stats'"
+    ).fetchone()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS weather_stats (
+            city TEXT NOT NULL,
+            metric TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            mean REAL NOT NULL,
+            m2 REAL NOT NULL,
+            min REAL,
+            max REAL,
+            PRIMARY KEY (city, metric)
+        ) WITHOUT ROWID
+    ''')
+    # The same Welford update as RunningStats.update, applied by SQLite to every
+    # inserted reading, so all writers (threads, trackers, processes) share one copy
+    for metric in STATS_METRICS:
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS weather_stats_{metric}_on_insert AFTER INSERT ON weather_history BEGIN
+                INSERT INTO weather_stats VALUES (
+                    new.city, '{metric}', new.{metric} IS NOT NULL, coalesce(new.{metric}, 0.0), 0.0,
+                    new.{metric}, new.{metric}
+                )
+                ON CONFLICT (city, metric) DO UPDATE SET
+                    count = count + excluded.count,
+                    mean = CASE WHEN excluded.count THEN mean + (excluded.mean - mean) / (count + 1) ELSE mean END,
+                    m2 = CASE WHEN excluded.count
+                         THEN m2 + (excluded.mean - mean) * (excluded.mean - (mean + (excluded.mean - mean) / (count + 1)))
+                         ELSE m2 END,
+                    min = coalesce(min(min, excluded.min), min, excluded.min),
+                    max = coalesce(max(max, excluded.max), max, excluded.max);
+            END
+        ''')
+    if not stats_exist:
+        # One pass over readings stored before the stats table existed
+        stats = {}
+        for city, *values in cursor.execute(
+            f"SELECT city, {', '.join(STATS_METRICS)} FROM weather_history ORDER BY id"
+        ):
+            for metric, value in zip(STATS_METRICS, values):
+                stats.setdefault((city, metric), RunningStats()).update(value)
+        cursor.executemany(
+            "INSERT INTO weather_stats VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(city, metric, s.count, s.mean, s.m2, s.min, s.max) for (city, metric), s in stats.items()]
+        )
+    
     conn.commit()
     conn.close()
     print("Database setup completed")
@@ -59,9 +230,26 @@ print("\nStep 2: Creating weather data fetcher")
 class WeatherTracker:
     """Class to handle weather data operations"""
     
-    def __init__(self, api_key=None):
+    INSERT_SQL = '''
+        INSERT INTO weather_history 
+        (city, temperature, humidity, description)
+        VALUES (?, ?, ?, ?)
+    '''
+    
+    def __init__(self, api_key=None, db_path="weather_data.db", base_url=None):
         self.api_key = api_key or "fake-key-for-demo"  # In real app, use actual API key
-        self.base_url = "https://api.openweathermap.org/data/2.5/weather"
+        self.base_url = base_url or "https://api.openweathermap.org/data/2.5/weather"
+        
+        # One long-lived connection instead of connect/commit/close per call.
+        # The lock serializes it between Flask worker threads and the flusher.
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._db_lock = threading.Lock()
+        
+        self._queue = None
+        self._flusher = None
     
     def get_weather(self, city):
         """Get current weather for a city"""
@@ -89,62 +277,274 @@ class WeatherTracker:
                 ]
             }
             
-            return {
-                "city": simulated_data["name"],
-                "temperature": simulated_data["main"]["temp"],
-                "humidity": simulated_data["main"]["humidity"],
-                "description": simulated_data["weather"][0]["description"],
-                "timestamp": datetime.now().isoformat()
-            }
+            return self.to_reading(simulated_data)
         except Exception as e:
             print(f"Error fetching weather data: {e}")
             return None
     
+    @staticmethod
+    def to_reading(data):
+        """Convert an OpenWeatherMap response into the reading dict we store"""
+        return {
+            "city": data["name"],
+            "temperature": data["main"]["temp"],
+            "humidity": data["main"]["humidity"],
+            "description": data["weather"][0]["description"],
+            "timestamp": datetime.now().isoformat()
+        }
+    
+    def fetch_weather(self, city, timeout=5.0, session=None):
+        """Fetch current weather for a city over HTTP; raises on network or HTTP errors"""
+        params = {
+            "q": city,
+            "appid": self.api_key,
+            "units": "metric"
+        }
+        response = (session or requests).get(self.base_url, params=params, timeout=timeout)
+        response.raise_for_status()
+        return self.to_reading(response.json())
+    
+    def fetch_many(self, cities, max_workers=16, timeout=5.0):
+        """Fetch many cities concurrently, yielding (city, reading, error) as each completes
+        
+        At most max_workers requests are in flight at once, and each one gives up
+        after timeout seconds, so a collection cycle takes roughly
+        len(cities) / max_workers * latency instead of the sum of all latencies.
+        Closing the generator early cancels the cities that haven't started.
+        """
+        local = threading.local()
+        
+        def fetch(city):
+            # requests.Session isn't thread-safe, so each worker keeps its own (and its connections)
+            if not hasattr(local, "session"):
+                local.session = requests.Session()
+            return self.fetch_weather(city, timeout=timeout, session=local.session)
+        
+        pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="weather-fetch")
+        try:
+            futures = {pool.submit(fetch, city): city for city in cities}
+            for future in as_completed(futures):
+                city = futures[future]
+                try:
+                    yield city, future.result(), None
+                except Exception as e:
+                    yield city, None, e
+        finally:
+            # If the caller stops early, drop the queued cities and don't wait for
+            # requests already in flight; they end on their own timeout
+            pool.shutdown(wait=False, cancel_futures=True)
+    
+    @staticmethod
+    def normalize_reading(reading):
+        """Copy of reading with temperature/humidity as floats; raises ValueError if invalid
+        
+        Numbers, numeric strings and None are accepted. Booleans, NaN, infinity
+        and anything else are rejected before they reach the table.
+        """
+        city = reading.get("city")
+        if not isinstance(city, str) or not city.strip():
+            raise ValueError("city must be a non-empty string")
+        normalized = dict(reading)
+        for field in STATS_METRICS:
+            value = reading.get(field)
+            if value is None:
+                continue
+            try:
+                if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+                    raise ValueError
+                number = float(value)
+            except (ValueError, OverflowError):
+                raise ValueError(f"{field} must be a number") from None
+            if not math.isfinite(number):
+                raise ValueError(f"{field} must be a finite number")
+            normalized[field] = number
+        return normalized
+    
+    def save_many(self, readings):
+        """Insert a batch of readings in one transaction; returns the number saved (0 on error)"""
+        try:
+            return self._write_batch(readings)
+        except Exception as e:
+            print(f"Error saving weather data: {e}")
+            return 0
+    
+    def _write_batch(self, readings):
+        """Insert a batch of readings in one transaction; raises if it can't be committed
+        
+        Every reading is validated first, so one bad value rejects the batch
+        before anything is written. The insert trigger updates weather_stats
+        in the same transaction.
+        """
+        rows = [
+            (r["city"], r["temperature"], r["humidity"], r["description"])
+            for r in map(self.normalize_reading, readings)
+        ]
+        if not rows:
+            return 0
+        with self._db_lock:
+            with self.conn:  # commits once for the whole batch
+                self.conn.executemany(self.INSERT_SQL, rows)
+        return len(rows)
+    
+    def get_stats(self, city=None):
+        """Running statistics for one city (None if unknown) or all cities
+        
+        Reads the rows the insert trigger maintains, one per city and metric,
+        instead of scanning the history.
+        """
+        query = "SELECT city, metric, count, mean, m2, min, max FROM weather_stats"
+        with self._db_lock:
+            if city is None:
+                rows = self.conn.execute(query).fetchall()
+            else:
+                rows = self.conn.execute(query + " WHERE city = ?", (city,)).fetchall()
+        stats = {}
+        for name, metric, *values in rows:
+            stats.setdefault(name, {})[metric] = RunningStats(*values).to_dict()
+        return stats.get(city) if city is not None else stats
+
     def save_weather_data(self, weather_data):
         """Save weather data to database"""
-        try:
-            conn = sqlite3.connect("weather_data.db")
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO weather_history 
-                (city, temperature, humidity, description)
-                VALUES (?, ?, ?, ?)
-            ''', (
-                weather_data["city"],
-                weather_data["temperature"],
-                weather_data["humidity"],
-                weather_data["description"]
-            ))
-            
-            conn.commit()
-            conn.close()
+        if self.save_many([weather_data]):
             print(f"Weather data for {weather_data['city']} saved to database")
+    
+    def start_flusher(self, max_rows=500, max_delay_ms=50):
+        """Start a background thread that group-commits submitted readings
+        
+        A batch is written as soon as it holds max_rows readings, or
+        max_delay_ms after its first reading arrived, whichever comes first.
+        """
+        if self._flusher is not None:
+            return
+        self._queue = queue.Queue()
+        self._flusher = threading.Thread(
+            target=self._flush_loop, args=(max_rows, max_delay_ms / 1000),
+            name="weather-flusher", daemon=True
+        )
+        self._flusher.start()
+    
+    def _flush_loop(self, max_rows, max_delay):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.monotonic() + max_delay
+            while len(batch) < max_rows:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._commit_queued(batch)
+    
+    def _commit_queued(self, batch):
+        """Write queued (reading, future) pairs and report the outcome to every waiter"""
+        error = None
+        try:
+            self._write_batch([reading for reading, _ in batch])
         except Exception as e:
             print(f"Error saving weather data: {e}")
+            error = e
+        for _, result in batch:
+            if result is None:
+                continue
+            if error is None:
+                result.set_result(None)
+            else:
+                result.set_exception(error)
     
-    def get_weather_history(self, city=None, limit=10):
-        """Get weather history from database"""
+    def submit(self, weather_data, wait=False):
+        """Queue a reading for the flusher (or save it directly if none is running)
+        
+        With wait=True the call returns once the batch holding it was committed,
+        and raises the error instead if that batch could not be written.
+        """
+        if self._flusher is None:
+            self._write_batch([weather_data])
+            return
+        result = Future() if wait else None
+        self._queue.put((weather_data, result))
+        if result is not None:
+            result.result()
+    
+    def stop_flusher(self):
+        """Write everything still queued and stop the flusher thread"""
+        if self._flusher is None:
+            return
+        self._queue.put(None)
+        self._flusher.join()
+        self._flusher = None
+        # Readings submitted after the stop marker are saved here
+        leftovers = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not None:
+                leftovers.append(item)
+        if leftovers:
+            self._commit_queued(leftovers)
+        self._queue = None
+    
+    def close(self):
+        """Flush pending readings and close the database connection"""
+        self.stop_flusher()
+        self.conn.close()
+    
+    # Ranges longer than these are answered from the rollup tables
+    HOURLY_AFTER = timedelta(days=2)
+    DAILY_AFTER = timedelta(days=90)
+    
+    def resolution_for(self, start=None, end=None):
+        """Pick "raw", "hourly" or "daily" for a history query over [start, end)"""
+        if start is None and end is None:
+            return "raw"
+        if start is None:
+            return "daily"
+        span = (end or datetime.now(timezone.utc).replace(tzinfo=None)) - start
+        if span > self.DAILY_AFTER:
+            return "daily"
+        if span > self.HOURLY_AFTER:
+            return "hourly"
+        return "raw"
+    
+    def get_weather_history(self, city=None, limit=10, start=None, end=None):
+        """Get weather history from database
+        
+        With a start/end range (UTC datetimes, end exclusive) longer than
+        HOURLY_AFTER, the whole hourly or daily buckets overlapping the range
+        are read from the rollup tables instead of the raw readings.
+        """
         try:
-            conn = sqlite3.connect("weather_data.db")
-            cursor = conn.cursor()
+            resolution = self.resolution_for(start, end)
+            if resolution != "raw":
+                return self._get_rollups(resolution, city, limit, start, end)
             
+            conditions, params = [], []
             if city:
-                cursor.execute('''
-                    SELECT * FROM weather_history 
-                    WHERE city = ? 
-                    ORDER BY timestamp DESC 
-                    LIMIT ?
-                ''', (city, limit))
-            else:
-                cursor.execute('''
-                    SELECT * FROM weather_history 
-                    ORDER BY timestamp DESC 
-                    LIMIT ?
-                ''', (limit,))
+                conditions.append("city = ?")
+                params.append(city)
+            if start is not None:
+                conditions.append("timestamp >= ?")
+                params.append(start.strftime("%Y-%m-%d %H:%M:%S"))
+            if end is not None:
+                conditions.append("timestamp < ?")
+                params.append(end.strftime("%Y-%m-%d %H:%M:%S"))
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
             
-            rows = cursor.fetchall()
-            conn.close()
+            with self._db_lock:
+                rows = self.conn.execute(f'''
+                    SELECT * FROM weather_history
+                    {where}
+                    ORDER BY timestamp DESC
+                    LIMIT ?
+                ''', params + [limit]).fetchall()
             
             # Convert to list of dictionaries
             columns = ["id", "city", "temperature", "humidity", "description", "timestamp"]
@@ -156,6 +556,39 @@ class WeatherTracker:
         except Exception as e:
             print(f"Error retrieving weather history: {e}")
             return []
+    
+    def _get_rollups(self, resolution, city, limit, start, end):
+        """Read hourly/daily buckets overlapping [start, end) from a rollup table"""
+        table = "weather_hourly" if resolution == "hourly" else "weather_daily"
+        conditions, params = [], []
+        if city:
+            conditions.append("city = ?")
+            params.append(city)
+        if start is not None:
+            conditions.append("bucket >= ?")
+            params.append(start.strftime(ROLLUP_TABLES[table]))
+        if end is not None:
+            # A bucket overlaps the range if it starts before end
+            end_bucket = end.strftime(ROLLUP_TABLES[table])
+            starts_at_end = datetime.strptime(end_bucket, ROLLUP_TABLES[table]) == end
+            conditions.append("bucket < ?" if starts_at_end else "bucket <= ?")
+            params.append(end_bucket)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        
+        with self._db_lock:
+            rows = self.conn.execute(f'''
+                SELECT city, bucket, readings,
+                       temp_sum / NULLIF(temp_count, 0), temp_min, temp_max,
+                       humidity_sum / NULLIF(humidity_count, 0), humidity_min, humidity_max
+                FROM {table}
+                {where}
+                ORDER BY bucket DESC
+                LIMIT ?
+            ''', params + [limit]).fetchall()
+        
+        columns = ["city", "period", "readings", "temperature_avg", "temperature_min", "temperature_max",
+                   "humidity_avg", "humidity_min", "humidity_max"]
+        return [dict(zip(columns, row), resolution=resolution) for row in rows]
 
 # Initialize weather tracker
 weather_tracker = WeatherTracker()
@@ -164,13 +597,91 @@ print("\nStep 3: Simulating weather data collection")
 
 # Simulate collecting weather data
 cities = ["New York", "London", "Tokyo", "Sydney", "Paris"]
+readings = []
 for city in cities:
     weather_data = weather_tracker.get_weather(city)
     if weather_data:
-        weather_tracker.save_weather_data(weather_data)
+        readings.append(weather_data)
+
+# One transaction for the whole collection cycle
+saved = weather_tracker.save_many(readings)
+print(f"Saved {saved} readings in one batch")
 
 print("Weather data collection completed")
 
+print("\nStep 3b: Fetching many cities concurrently")
+
+class StubWeatherHandler(BaseHTTPRequestHandler):
+    """Local stand-in for the OpenWeatherMap API: 50 ms latency, same response shape"""
+    
+    def do_GET(self):
+        from urllib.parse import urlparse, parse_qs
+        city = parse_qs(urlparse(self.path).query).get("q", [""])[0]
+        if city == "Slowville":
+            time.sleep(2)  # longer than the client timeout
+        else:
+            time.sleep(0.05)
+        if city == "Atlantis":
+            body, status = {"cod": "404", "message": "city not found"}, 404
+        else:
+            body, status = {
+                "name": city,
+                "main": {"temp": 10 + len(city) % 20, "humidity": 40 + len(city) % 50},
+                "weather": [{"description": "clear sky"}]
+            }, 200
+        payload = json.dumps(body).encode()
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client already timed out
+    
+    def log_message(self, format, *args):
+        pass  # keep the demo output readable
+
+class StubWeatherServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # the default backlog of 5 drops connects under concurrent load
+
+def demo_fetch_many(city_count=40, max_workers=10, timeout=0.5):
+    """Run fetch_many against the stub server and compare with the sequential time"""
+    server = StubWeatherServer(("127.0.0.1", 0), StubWeatherHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        tracker = WeatherTracker(
+            api_key="stub-key",
+            db_path=":memory:",  # HTTP only, no database needed
+            base_url=f"http://127.0.0.1:{server.server_address[1]}/data/2.5/weather"
+        )
+        
+        names = [f"City {i}" for i in range(city_count - 2)] + ["Atlantis", "Slowville"]
+        start = time.perf_counter()
+        fetched, failed = [], []
+        for city, reading, error in tracker.fetch_many(names, max_workers=max_workers, timeout=timeout):
+            if error is None:
+                fetched.append(reading)
+            else:
+                failed.append(f"{city} ({type(error).__name__})")
+        elapsed = time.perf_counter() - start
+        
+        print(f"Fetched {len(fetched)} cities in {elapsed:.2f}s with {max_workers} workers "
+              f"(sequential would take at least {city_count * 0.05:.2f}s)")
+        print(f"Failed: {', '.join(failed)}")
+        tracker.close()
+        return fetched
+    finally:
+        server.shutdown()
+        server.server_close()
+
+# Starts a local HTTP server and takes a few seconds, so it only runs on request
+if "--fetch-demo" in sys.argv:
+    demo_fetch_many()
+else:
+    print("Skipped (run with --fetch-demo to try fetch_many against a local stub server)")
+
 print("\nStep 4: Creating Flask API for weather data")
 
 # Create Flask application
@@ -186,6 +697,7 @@ def home():
         <li><a href="/api/weather">/api/weather</a> - Get all weather data</li>
         <li><a href="/api/weather/New York">/api/weather/&lt;city&gt;</a> - Get weather for specific city</li>
         <li><a href="/api/history">/api/history</a> - Get weather history</li>
+        <li><a href="/api/stats">/api/stats</a> - Running statistics per city</li>
     </ul>
     '''
 
@@ -224,18 +736,39 @@ def get_weather_for_city(city):
             "message": str(e)
         }), 500
 
+def parse_utc(value):
+    """Parse an ISO 8601 timestamp into the naive UTC datetime the database stores
+
+    Timestamps with an offset are converted to UTC; ones without are taken as UTC.
+    """
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
 @app.route("/api/history")
 @app.route("/api/history/<city>")
 def get_weather_history(city=None):
     """Get weather history"""
     try:
         limit = request.args.get("limit", 10, type=int)
-        history = weather_tracker.get_weather_history(city, limit)
+        try:
+            start, end = (
+                parse_utc(request.args[name]) if request.args.get(name) else None
+                for name in ("start", "end")
+            )
+        except ValueError:
+            return jsonify({
+                "status": "error",
+                "message": "start and end must be ISO 8601 timestamps (UTC)"
+            }), 400
+        history = weather_tracker.get_weather_history(city, limit, start, end)
         
         return jsonify({
             "status": "success",
             "data": history,
-            "count": len(history)
+            "count": len(history),
+            "resolution": weather_tracker.resolution_for(start, end)
         })
     except Exception as e:
         return jsonify({
@@ -243,11 +776,32 @@ def get_weather_history(city=None):
             "message": str(e)
         }), 500
 
+@app.route("/api/stats")
+@app.route("/api/stats/<city>")
+def get_weather_stats(city=None):
+    """Running temperature/humidity statistics over all stored readings"""
+    stats = weather_tracker.get_stats(city)
+    if stats is None:
+        return jsonify({
+            "status": "error",
+            "message": f"No statistics for {city}"
+        }), 404
+    
+    return jsonify({
+        "status": "success",
+        "data": stats
+    })
+
 @app.route("/api/add_weather", methods=["POST"])
 def add_weather_data():
     """Add weather data via API"""
     try:
         data = request.get_json()
+        if not isinstance(data, dict):
+            return jsonify({
+                "status": "error",
+                "message": "Request body must be a JSON object"
+            }), 400
         required_fields = ["city", "temperature", "humidity", "description"]
         
         for field in required_fields:
@@ -257,8 +811,16 @@ def add_weather_data():
                     "message": f"Missing required field: {field}"
                 }), 400
         
-        # Save to database
-        weather_tracker.save_weather_data(data)
+        try:
+            data = weather_tracker.normalize_reading(data)
+        except ValueError as e:
+            return jsonify({
+                "status": "error",
+                "message": str(e)
+            }), 400
+        
+        # Save to database (group-committed if the background flusher is running)
+        weather_tracker.submit(data, wait=True)
         
         return jsonify({
             "status": "success",
@@ -290,30 +852,23 @@ print("\nStep 5: Demonstrating JSON processing")
 
 # Process and analyze weather data
 def analyze_weather_data():
-    """Analyze weather data from database"""
-    history = weather_tracker.get_weather_history(limit=100)
+    """Analyze weather data from the running per-city statistics"""
+    stats = weather_tracker.get_stats()
     
-    if not history:
+    if not stats:
         print("No weather data available for analysis")
         return
     
-    # Calculate statistics
-    temperatures = [item["temperature"] for item in history if item["temperature"] is not None]
-    humidities = [item["humidity"] for item in history if item["humidity"] is not None]
-    
-    if temperatures:
-        avg_temp = sum(temperatures) / len(temperatures)
-        max_temp = max(temperatures)
-        min_temp = min(temperatures)
-        
-        print(f"Temperature Analysis:")
-        print(f"  Average: {avg_temp:.2f}°C")
-        print(f"  Max: {max_temp}°C")
-        print(f"  Min: {min_temp}°C")
-    
-    if humidities:
-        avg_humidity = sum(humidities) / len(humidities)
-        print(f"  Average Humidity: {avg_humidity:.2f}%")
+    # Statistics cover every stored reading and are read without scanning the table
+    print(f"Temperature Analysis:")
+    for city, metrics in sorted(stats.items()):
+        temp, humidity = metrics["temperature"], metrics["humidity"]
+        if temp["count"]:
+            stddev = f"{temp['stddev']:.2f}" if temp["stddev"] is not None else "n/a"
+            print(f"  {city}: average {temp['mean']:.2f}°C (std dev {stddev}), "
+                  f"max {temp['max']}°C, min {temp['min']}°C over {temp['count']} readings")
+        if humidity["count"]:
+            print(f"  {city}: average humidity {humidity['mean']:.2f}%")
 
 analyze_weather_data()
 
@@ -338,36 +893,174 @@ print(f"10 / 'a' = {safe_divide(10, 'a')}")
 
 print("\nStep 7: Demonstrating file operations with weather data")
 
-# Export weather data to JSON file
-def export_weather_data():
-    """Export weather history to JSON file"""
+# Export weather data to a file, streaming rows from the database
+EXPORT_COLUMNS = ["id", "city", "temperature", "humidity", "description", "timestamp"]
+
+# Columnar format: b"WXC1", then blocks of (row count, one length-prefixed
+# payload per column), ending with a zero row count. Numbers are packed
+# little-endian arrays, strings a length array plus the concatenated UTF-8.
+COLUMNAR_MAGIC = b"WXC1"
+# humidity is stored with INTEGER affinity but can hold REAL values, so it travels as a double
+COLUMNAR_TYPES = {"id": "q", "city": "s", "temperature": "d", "humidity": "d",
+                  "description": "s", "timestamp": "s"}
+NULL_INT = -2 ** 31
+NULL_LENGTH = 2 ** 32 - 1
+
+class HashingWriter(io.RawIOBase):
+    """Binary sink that hashes and counts bytes on their way to the file"""
+    
+    def __init__(self, raw):
+        self.raw = raw
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+    
+    def writable(self):
+        return True
+    
+    def write(self, data):
+        self.sha256.update(data)
+        self.size += len(data)
+        return self.raw.write(data)
+
+def _little_endian(values):
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tobytes()
+
+def _encode_column(kind, values):
+    if kind == "s":
+        encoded = [None if v is None else str(v).encode() for v in values]
+        lengths = array("I", (NULL_LENGTH if b is None else len(b) for b in encoded))
+        return _little_endian(lengths) + b"".join(b for b in encoded if b)
+    if kind == "d":
+        return _little_endian(array("d", (float("nan") if v is None else v for v in values)))
+    return _little_endian(array(kind, (NULL_INT if v is None else v for v in values)))
+
+def _decode_column(kind, payload, count):
+    if kind == "s":
+        lengths = array("I")
+        lengths.frombytes(payload[:4 * count])
+        if sys.byteorder == "big":
+            lengths.byteswap()
+        values, offset = [], 4 * count
+        for length in lengths:
+            if length == NULL_LENGTH:
+                values.append(None)
+            else:
+                values.append(payload[offset:offset + length].decode())
+                offset += length
+        return values
+    values = array(kind)
+    values.frombytes(payload)
+    if sys.byteorder == "big":
+        values.byteswap()
+    if kind == "d":
+        return [None if v != v else v for v in values]  # NaN marks NULL
+    return [None if v == NULL_INT else v for v in values]
+
+def read_columnar(path):
+    """Yield row dicts from a columnar export (gzip-compressed or not), one block at a time"""
+    with open(path, "rb") as raw:
+        compressed = raw.read(2) == b"\x1f\x8b"
+        raw.seek(0)
+        f = gzip.GzipFile(fileobj=raw) if compressed else raw
+        if f.read(4) != COLUMNAR_MAGIC:
+            raise ValueError(f"{path} is not a columnar weather export")
+        while True:
+            (count,) = struct.unpack("<I", f.read(4))
+            if count == 0:
+                return
+            columns = []
+            for name in EXPORT_COLUMNS:
+                (size,) = struct.unpack("<I", f.read(4))
+                columns.append(_decode_column(COLUMNAR_TYPES[name], f.read(size), count))
+            for values in zip(*columns):
+                yield dict(zip(EXPORT_COLUMNS, values))
+
+def export_weather_data(path=None, fmt="ndjson", compress=False, batch_size=1000):
+    """Stream the weather history to an NDJSON, CSV or columnar file
+    
+    Rows are pulled from the cursor batch_size at a time, so memory stays
+    constant however large the table is. A SHA-256 of the bytes written is
+    computed on the fly and stored next to the export as <path>.sha256.
+    If the export fails, the partial file is removed.
+    """
+    if fmt not in ("ndjson", "csv", "columnar"):
+        raise ValueError(f"Unknown export format: {fmt}")
+    extension = {"ndjson": "ndjson", "csv": "csv", "columnar": "wxc"}[fmt]
+    path = path or f"weather_export.{extension}" + (".gz" if compress else "")
+    
+    # A separate connection reads a consistent snapshot without holding the tracker's lock
+    conn = sqlite3.connect(weather_tracker.db_path)
+    rows_written = 0
     try:
-        history = weather_tracker.get_weather_history(limit=50)
-        
-        # Create export data
-        export_data = {
-            "export_timestamp": datetime.now().isoformat(),
-            "total_records": len(history),
-            "weather_data": history
-        }
-        
-        # Write to JSON file
-        with open("weather_export.json", "w") as f:
-            json.dump(export_data, f, indent=2)
-        
-        print(f"Weather data exported to weather_export.json ({len(history)} records)")
-        
-        # Read it back to verify
-        with open("weather_export.json", "r") as f:
-            loaded_data = json.load(f)
-        
-        print(f"Export file loaded successfully. Records: {len(loaded_data['weather_data'])}")
-        
+        with open(path, "wb") as raw:
+            sink = HashingWriter(raw)
+            binary = gzip.GzipFile(fileobj=sink, mode="wb", mtime=0) if compress else sink
+            text = io.TextIOWrapper(binary, encoding="utf-8", newline="") if fmt != "columnar" else None
+            writer = csv.writer(text) if fmt == "csv" else None
+            
+            if fmt == "csv":
+                writer.writerow(EXPORT_COLUMNS)
+            elif fmt == "columnar":
+                binary.write(COLUMNAR_MAGIC)
+            
+            cursor = conn.execute(f"SELECT {', '.join(EXPORT_COLUMNS)} FROM weather_history ORDER BY id")
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                rows_written += len(rows)
+                if fmt == "ndjson":
+                    text.write("".join(json.dumps(dict(zip(EXPORT_COLUMNS, row))) + "\n" for row in rows))
+                elif fmt == "csv":
+                    writer.writerows(rows)
+                else:
+                    binary.write(struct.pack("<I", len(rows)))
+                    for name, values in zip(EXPORT_COLUMNS, zip(*rows)):
+                        payload = _encode_column(COLUMNAR_TYPES[name], values)
+                        binary.write(struct.pack("<I", len(payload)) + payload)
+            
+            if fmt == "columnar":
+                binary.write(struct.pack("<I", 0))
+            if text is not None:
+                text.flush()
+                text.detach()
+            if compress:
+                binary.close()  # writes the gzip trailer through the hashing sink
+    except BaseException:
+        # Never leave a truncated export, or the checksum of an older one, behind
+        for leftover in (path, path + ".sha256"):
+            try:
+                os.remove(leftover)
+            except OSError:
+                pass
+        raise
+    finally:
+        conn.close()
+    
+    checksum = sink.sha256.hexdigest()
+    with open(path + ".sha256", "w") as f:
+        f.write(f"{checksum}  {os.path.basename(path)}\n")  # sha256sum -c compatible
+    return {"path": path, "rows": rows_written, "bytes": sink.size, "sha256": checksum}
+
+def verify_export(path, expected_sha256, chunk_size=1 << 20):
+    """Check an export against its checksum by hashing the file in fixed-size chunks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest() == expected_sha256
+
+for fmt, compress in [("ndjson", False), ("csv", True), ("columnar", False)]:
+    try:
+        export = export_weather_data(fmt=fmt, compress=compress)
+        status = "checksum OK" if verify_export(export["path"], export["sha256"]) else "CHECKSUM MISMATCH"
+        print(f"Weather data exported to {export['path']} "
+              f"({export['rows']} records, {export['bytes']} bytes, {status})")
     except Exception as e:
         print(f"Error exporting weather data: {e}")
 
-export_weather_data()
-
 print("\nStep 8: Demonstrating complex data processing")
 
 def process_weather_records(records):
@@ -478,10 +1171,62 @@ print("- File operations")
 print("- Complex data processing")
 print("- Integration of multiple Python concepts")
 
+def benchmark_ingest(n=5000):
+    """Compare rows/second for per-call connections, save_weather_data, save_many and the flusher"""
+    import tempfile
+    
+    readings = [
+        {"city": f"City {i % 100}", "temperature": 20 + i % 15, "humidity": 40 + i % 50, "description": "clear sky"}
+        for i in range(n)
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        tracker = WeatherTracker(db_path=db_path)
+        tracker.conn.execute('''
+            CREATE TABLE weather_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, city TEXT NOT NULL, temperature REAL,
+                humidity INTEGER, description TEXT, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        def connect_per_row():
+            for r in readings:
+                conn = sqlite3.connect(db_path)
+                conn.execute(WeatherTracker.INSERT_SQL, (r["city"], r["temperature"], r["humidity"], r["description"]))
+                conn.commit()
+                conn.close()
+        
+        def commit_per_row():
+            for r in readings:
+                tracker.save_many([r])
+        
+        def group_commit():
+            tracker.start_flusher(max_rows=500, max_delay_ms=20)
+            for r in readings:
+                tracker.submit(r)
+            tracker.stop_flusher()
+        
+        for label, run in [("connect per row", connect_per_row),
+                           ("persistent conn", commit_per_row),
+                           ("save_many", lambda: tracker.save_many(readings)),
+                           ("background flusher", group_commit)]:
+            start = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - start
+            print(f"{label:>20}: {n / elapsed:>10,.0f} rows/s")
+        tracker.close()
+
+if "--benchmark" in sys.argv:
+    print("\nIngest benchmark:")
+    benchmark_ingest()
+
 # Clean up demo files
 def cleanup_demo_files():
     """Clean up files created during the demo"""
-    files_to_remove = ["weather_export.json", "weather_data.db"]
+    weather_tracker.close()
+    files_to_remove = ["weather_data.db", "weather_data.db-wal", "weather_data.db-shm"]
+    for export in ["weather_export.ndjson", "weather_export.csv.gz", "weather_export.wxc"]:
+        files_to_remove += [export, export + ".sha256"]
     for file in files_to_remove:
         try:
             if os.path.exists(file):
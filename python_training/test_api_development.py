@@ -0,0 +1,351 @@
+"""
+Python Training - File 19 Test Suite
+
+The API examples in the training file are code strings; each test writes
+one of them to a scratch directory, runs it as a module and exercises the
+Flask app it defines.
+"""
+
+import ast
+import contextlib
+import io
+import os
+import runpy
+
+import pytest
+
+SCRIPT = os.path.join(os.path.dirname(__file__), "19_api_development.py")
+
+
+def code_string(name):
+    """Source of the module-level string assigned to name in the training file"""
+    with open(SCRIPT, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and getattr(node.targets[0], "id", None) == name:
+            return node.value.value
+    raise KeyError(name)
+
+
+@pytest.fixture
+def load_example(tmp_path, monkeypatch):
+    """Run a code string as a module in tmp_path and return its globals"""
+    monkeypatch.chdir(tmp_path)
+
+    def load(name):
+        path = tmp_path / f"{name}.py"
+        path.write_text(code_string(name), encoding="utf-8")
+        return runpy.run_path(str(path), run_name=name)
+    return load
+
+
+@pytest.fixture
+def db_api(load_example):
+    api = load_example("db_api_code")
+    api["init_db"]()
+    return api
+
+
+def test_products_query_plans_are_bounded(db_api):
+    """check_query_plans passes: narrow price ranges seek, everything else is served in index order"""
+    with contextlib.redirect_stdout(io.StringIO()) as out:
+        db_api["check_query_plans"]()
+    assert "all bounded" in out.getvalue()
+
+
+def test_price_filter_picks_index_by_selectivity(db_api, monkeypatch):
+    """Narrow and wide price ranges page through the same rows, newest first"""
+    module_globals = db_api["price_range_is_narrow"].__globals__  # run_path returns a copy
+    monkeypatch.setitem(module_globals, "PRICE_SEEK_MAX_ROWS", 20)
+    client = db_api["app"].test_client()
+    for i in range(100):
+        client.post("/api/products", json={"name": f"Product {i}", "price": i})
+
+    with db_api["pool"].connection() as conn:
+        assert db_api["price_range_is_narrow"](conn, 10, 14)
+        assert not db_api["price_range_is_narrow"](conn, 0, None)
+
+    for min_price, max_price in [(10, 14), (0, None), (None, 49.5)]:
+        seen, cursor = [], None
+        while True:
+            query = {"limit": 7, "cursor": cursor, "min_price": min_price, "max_price": max_price}
+            query = {key: value for key, value in query.items() if value is not None}
+            body = client.get("/api/products", query_string=query).get_json()
+            seen += [product["id"] for product in body["data"]]
+            cursor = body["next_cursor"]
+            if cursor is None:
+                break
+        expected = [i + 1 for i in reversed(range(100))
+                    if (min_price is None or i >= min_price) and (max_price is None or i <= max_price)]
+        assert seen == expected
+
+
+def test_api_key_cache_holds_only_digests(load_example):
+    """Verified keys are cached by their SHA-256 digest, never in plaintext"""
+    auth = load_example("auth_api_code")
+    store = auth["key_store"]
+    try:
+        client = auth["app"].test_client()
+        for _ in range(2):
+            response = client.get("/api/protected", headers={"Authorization": "Bearer sk-1234567890abcdef"})
+            assert response.get_json()["user_role"] == "admin"
+        assert client.get("/api/protected", headers={"Authorization": "Bearer sk-wrong"}).status_code == 401
+        assert list(store._cache) == [auth["hash_api_key"]("sk-1234567890abcdef")]
+    finally:
+        store.close()
+
+
+def test_user_repository_crud_never_reuses_ids(load_example):
+    """Users are listed in insertion order and deleted ids are not handed out again"""
+    api = load_example("basic_api_code")
+    client = api["app"].test_client()
+
+    created = client.post("/api/users", json={"name": "Dana", "email": "dana@example.com"}).get_json()["data"]
+    assert created["id"] == 4
+    assert client.delete("/api/users/4").status_code == 200
+    assert client.get("/api/users/4").status_code == 404
+    assert client.delete("/api/users/4").status_code == 404
+    again = client.post("/api/users", json={"name": "Eve", "email": "eve@example.com"}).get_json()["data"]
+    assert again["id"] == 5
+
+    response = client.put("/api/users/2", json={"age": 33, "role": "ignored"})
+    assert response.get_json()["data"] == {"id": 2, "name": "Bob", "email": "bob@example.com", "age": 33}
+    assert client.put("/api/users/99", json={"age": 1}).status_code == 404
+
+    body = client.get("/api/users").get_json()
+    assert [user["id"] for user in body["data"]] == [1, 2, 3, 5]
+    assert body["count"] == 4
+
+
+def test_sliding_window_counter_weights_the_previous_window(load_example):
+    """A full window blocks, half of it still counts once the next window starts"""
+    check_window = load_example("rate_limiting_code")["check_window"]
+    state = (0, 0, 0)
+    for _ in range(5):
+        allowed, _, state = check_window(state, 10.0, 5, 60)
+        assert allowed
+    allowed, retry_after, state = check_window(state, 10.0, 5, 60)
+    assert not allowed and retry_after >= 1
+
+    # At t=90 the previous window (5 hits) weighs 0.5: 2.5 + 2 new hits fit, a third does not
+    results = []
+    for _ in range(3):
+        allowed, retry_after, state = check_window(state, 90.0, 5, 60)
+        results.append(allowed)
+    assert results == [True, True, False]
+    assert check_window(state, 90.0 + retry_after, 5, 60)[0]
+    assert check_window(state, 200.0, 5, 60)[2] == (180.0, 1, 0)  # idle for a whole window: state resets
+
+
+def test_rate_limiters_bound_memory_and_share_state(load_example):
+    """The in-process limiter evicts idle clients; SQLite limiters on one file share a limit"""
+    api = load_example("rate_limiting_code")
+    limiter = api["SlidingWindowLimiter"](max_requests=2, window=60, max_clients=2)
+    for key in ("a", "b", "c"):
+        limiter.hit(key)
+    assert list(limiter._clients) == ["b", "c"]
+
+    workers = [api["SQLiteWindowLimiter"](3, 60, db_path="shared.db") for _ in range(2)]
+    allowed = [workers[i % 2].hit("client")[0] for i in range(4)]
+    assert allowed == [True, True, True, False]
+
+    client = api["app"].test_client()
+    statuses = [client.get("/api/data").status_code for _ in range(6)]
+    assert statuses == [200] * 5 + [429]
+    assert int(client.get("/api/data").headers["Retry-After"]) >= 1
+
+
+def test_connection_pool_reuses_tuned_connections(db_api):
+    """Connections are opened once in WAL mode, handed back clean, and checkout is bounded"""
+    import queue
+
+    pool = db_api["ConnectionPool"]("pool.db", size=2, timeout=0.05)
+    with pool.connection() as first:
+        assert first.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        first.execute("CREATE TABLE t (x)")
+        first.execute("INSERT INTO t VALUES (1)")  # left uncommitted
+    with pool.connection() as again:
+        assert again is first  # LIFO: the warmest connection comes back
+        assert not again.in_transaction
+        assert again.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+
+    with pool.connection(), pool.connection():
+        with pytest.raises(queue.Empty):
+            with pool.connection():
+                pass
+
+    client = db_api["app"].test_client()
+    product = client.post("/api/products", json={"name": "Lamp", "price": 20}).get_json()["data"]
+    assert client.get(f"/api/products/{product['id']}").get_json()["data"]["name"] == "Lamp"
+    assert client.get("/api/products/999").status_code == 404
+
+
+def test_full_text_search_matches_prefixes_and_pages_by_rank(db_api):
+    """q= and name= use the FTS index, stay in sync with edits and page through ranked results"""
+    client = db_api["app"].test_client()
+    for name, description in [("Laptop Pro", "fast laptop"), ("Café table", "oak"),
+                              ("Desk lamp", "for a laptop desk"), ("Chair", "plain")]:
+        client.post("/api/products", json={"name": name, "price": 10, "description": description})
+    for i in range(5):
+        client.post("/api/products", json={"name": f"Laptop {i}", "price": i})
+
+    def names(**query):
+        response = client.get("/api/products", query_string=query)
+        assert response.status_code == 200, response.get_json()
+        return {product["name"] for product in response.get_json()["data"]}
+
+    assert names(q="lap") == {"Laptop Pro", "Desk lamp"} | {f"Laptop {i}" for i in range(5)}
+    assert "Desk lamp" not in names(name="lap")
+    assert names(q="cafe") == {"Café table"}
+    assert names(q='la" OR "') == set()  # quotes are escaped, not FTS syntax
+    assert len(names(q="   ")) == 9  # whitespace only is a plain listing
+
+    with db_api["pool"].connection() as conn:
+        conn.execute("UPDATE products SET name = 'Stool' WHERE name = 'Chair'")
+        conn.execute("DELETE FROM products WHERE name = 'Laptop Pro'")
+        conn.commit()
+    assert names(q="stool") == {"Stool"} and names(q="chair") == set()
+    assert "Laptop Pro" not in names(q="laptop")
+
+    seen, cursor = [], None
+    while True:
+        query = {"q": "laptop", "limit": 2, **({"cursor": cursor} if cursor else {})}
+        body = client.get("/api/products", query_string=query).get_json()
+        seen += [product["id"] for product in body["data"]]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert len(seen) == len(set(seen)) == 6
+    plain_cursor = client.get("/api/products", query_string={"limit": 1}).get_json()["next_cursor"]
+    assert client.get("/api/products", query_string={"q": "laptop", "cursor": plain_cursor}).status_code == 400
+
+
+def test_cursor_pagination_over_virtual_and_sqlite_datasets(load_example):
+    """Cursors continue where the last page ended, deep pages are cheap, bad cursors are a 400"""
+    import sqlite3
+
+    api = load_example("pagination_api_code")
+    client = api["app"].test_client()
+    first = client.get("/api/items", query_string={"per_page": 3}).get_json()
+    assert [item["id"] for item in first["data"]] == [1, 2, 3]
+    assert first["pagination"]["has_next"] and not first["pagination"]["has_prev"]
+    second = client.get("/api/items", query_string={"cursor": first["pagination"]["next_cursor"]}).get_json()
+    assert second["data"][0]["id"] == 4 and second["pagination"]["per_page"] == 10
+
+    deep = api["encode_cursor"](api["DATASET_SIZE"] - 2)
+    last = client.get("/api/items", query_string={"cursor": deep}).get_json()
+    assert [item["id"] for item in last["data"]] == [api["DATASET_SIZE"] - 1, api["DATASET_SIZE"]]
+    assert last["pagination"]["next_cursor"] is None
+    assert last["pagination"]["total_pages"] == api["DATASET_SIZE"] // 10
+
+    for bad in ("garbage", api["encode_cursor"](-1), api["encode_cursor"](True), api["encode_cursor"]("7")):
+        assert client.get("/api/items", query_string={"cursor": bad}).status_code == 400
+
+    conn = sqlite3.connect("items.db")
+    conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)")
+    conn.executemany("INSERT INTO items VALUES (?, ?)", [(i, f"Item {i}") for i in (2, 3, 5, 8)])
+    conn.commit()
+    conn.close()
+    dataset = api["SQLiteDataset"]("items.db", "items")
+    assert [row["id"] for row in dataset.fetch_after(3, 10)] == [5, 8]
+    assert dataset.estimate_count() == 7  # max - min + 1: an upper bound, not COUNT(*)
+
+    calls = []
+    counted = api["GeneratorDataset"](lambda after: iter(()), count=lambda: calls.append(1) or 42)
+    cache = api["CountCache"](ttl=60)
+    assert [cache.get("n", counted) for _ in range(3)] == [42, 42, 42]
+    assert len(calls) == 1
+
+
+def test_task_filters_follow_updates_and_deletes(load_example):
+    """Status/priority filters stay correct through updates and deletes, in creation order"""
+    api = load_example("task_api_code")
+    client = api["app"].test_client()
+    ids = []
+    for i, (status, priority) in enumerate([("pending", "high"), ("done", "high"), ("pending", "low"),
+                                            ("pending", "high")]):
+        task = client.post("/api/tasks", json={"title": f"T{i}", "description": "d",
+                                               "status": status, "priority": priority}).get_json()["data"]
+        ids.append(task["id"])
+
+    def listed(**query):
+        return [task["id"] for task in client.get("/api/tasks", query_string=query).get_json()["data"]]
+
+    assert listed(status="pending", priority="high") == [ids[0], ids[3]]
+    assert listed(priority="high") == [ids[0], ids[1], ids[3]]
+    assert listed(status="archived") == []
+    assert listed() == ids
+
+    assert client.put(f"/api/tasks/{ids[0]}", json={"status": "done"}).status_code == 200
+    assert client.delete(f"/api/tasks/{ids[3]}").status_code == 200
+    assert listed(status="pending", priority="high") == []
+    assert listed(status="done") == [ids[0], ids[1]]
+
+    assert client.put(f"/api/tasks/{ids[1]}", json={"status": ["x"]}).status_code == 400
+    assert client.post("/api/tasks", json={"title": "t", "description": "d", "priority": {}}).status_code == 400
+    assert listed(status="done") == [ids[0], ids[1]]
+
+    client.delete(f"/api/tasks/{ids[2]}")  # the only "pending" and the only "low" task
+    assert api["tasks"]._indexes == {"status": {"done": {ids[0], ids[1]}}, "priority": {"high": {ids[0], ids[1]}}}
+
+
+class ListLogger:
+    def __init__(self):
+        self.messages = []
+
+    def error(self, message):
+        self.messages.append(message)
+
+
+def test_error_aggregator_samples_and_evicts(load_example, monkeypatch):
+    """Repeats of one fingerprint log a few tracebacks per window; the table stays bounded"""
+    api = load_example("error_handling_code")
+    clock = [1000.0]
+    aggregator_globals = api["ErrorAggregator"].record.__globals__
+    monkeypatch.setitem(aggregator_globals, "time", type("Clock", (), {"time": staticmethod(lambda: clock[0])}))
+    logger = ListLogger()
+    errors = api["ErrorAggregator"](logger, window=60, samples_per_window=2, max_fingerprints=2)
+
+    def divide():
+        return 1 / 0
+
+    def lookup():
+        return {}["missing"]
+
+    def record(func):
+        try:
+            func()
+        except Exception as e:
+            return errors.record(e)
+
+    ids = {record(divide) for _ in range(5)}
+    assert len(ids) == 1
+    assert sum("Unhandled exception" in m for m in logger.messages) == 2
+    (entry,) = errors.snapshot()
+    assert (entry["count"], entry["suppressed"], len(entry["samples"])) == (5, 3, 2)
+    assert entry["type"] == "builtins.ZeroDivisionError" and entry["location"].endswith("in divide")
+
+    clock[0] += 61
+    record(divide)
+    assert "repeated 3 more times" in logger.messages[-2]
+    assert "Unhandled exception" in logger.messages[-1]
+
+    assert record(lookup) != ids.pop()
+    record(lambda: int("x"))
+    assert errors.evicted == 1
+    assert [entry["type"] for entry in errors.snapshot()] == ["builtins.KeyError", "builtins.ValueError"]
+
+
+def test_unhandled_errors_are_reported_with_an_id(load_example):
+    """Crashes return a 500 with the fingerprint id; HTTP and API errors are not aggregated"""
+    api = load_example("error_handling_code")
+    client = api["app"].test_client()
+    first = client.get("/api/test-crash")
+    assert first.status_code == 500
+    assert client.get("/api/test-crash").get_json()["error_id"] == first.get_json()["error_id"]
+    assert client.post("/api/test-crash").status_code == 405
+    assert client.get("/api/test-error").get_json()["error_code"] == "TEST_ERROR"
+
+    table = client.get("/debug/errors").get_json()
+    assert table["fingerprints"] == 1 and table["data"][0]["count"] == 2
+    assert client.get("/debug/errors", environ_base={"REMOTE_ADDR": "10.0.0.1"}).status_code == 404
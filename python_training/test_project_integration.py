@@ -0,0 +1,246 @@
+"""
+Python Training - File 20 Test Suite
+
+Runs the project integration script once in a scratch directory and tests
+the weather tracker and API it defines against fresh databases.
+"""
+
+import contextlib
+import io
+import json
+import os
+import runpy
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import requests
+
+SCRIPT = os.path.join(os.path.dirname(__file__), "20_project_integration.py")
+
+
+@pytest.fixture(scope="module")
+def project(tmp_path_factory):
+    """Globals of the training script, executed once with its output discarded"""
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("project"))
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            namespace = runpy.run_path(SCRIPT, run_name="project_integration")
+    finally:
+        os.chdir(cwd)
+    return namespace
+
+
+@pytest.fixture
+def tracker(project, tmp_path, monkeypatch):
+    """A WeatherTracker on a new database, also used by the script's Flask routes"""
+    monkeypatch.chdir(tmp_path)
+    project["setup_database"]()
+    tracker = project["WeatherTracker"]()
+    route_globals = project["app"].view_functions["add_weather_data"].__globals__
+    monkeypatch.setitem(route_globals, "weather_tracker", tracker)
+    yield tracker
+    tracker.close()
+
+
+def reading(city="Oslo", temperature=4.5, humidity=80):
+    return {"city": city, "temperature": temperature, "humidity": humidity, "description": "fog"}
+
+
+def test_flusher_reports_failed_batch_to_waiters(project, tracker):
+    """A batch that can't be written raises in every waiting submit() and fails the API call"""
+    tracker.start_flusher(max_delay_ms=5)
+    tracker.submit(reading(), wait=True)
+    assert tracker.get_weather_history("Oslo")
+
+    with tracker._db_lock:
+        tracker.conn.execute("DROP TABLE weather_history")
+    with pytest.raises(sqlite3.OperationalError):
+        tracker.submit(reading(), wait=True)
+
+    response = project["app"].test_client().post("/api/add_weather", json=reading())
+    assert response.status_code == 500
+    assert response.get_json()["status"] == "error"
+
+
+@contextlib.contextmanager
+def stub_weather_api(project, delays):
+    """Local weather API answering each city after delays[city] seconds (unknown cities: 404)
+
+    Yields a dict whose "max_in_flight" entry records the highest number of
+    requests being served at the same time and "requests" the total received.
+    """
+    stats = {"in_flight": 0, "max_in_flight": 0, "requests": 0}
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            city = parse_qs(urlparse(self.path).query)["q"][0]
+            with lock:
+                stats["in_flight"] += 1
+                stats["requests"] += 1
+                stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+            try:
+                time.sleep(delays.get(city, 0))
+            finally:
+                with lock:
+                    stats["in_flight"] -= 1
+            if city in delays:
+                status, body = 200, {"name": city, "main": {"temp": 12.5, "humidity": 70},
+                                     "weather": [{"description": "rain"}]}
+            else:
+                status, body = 404, {"cod": "404", "message": "city not found"}
+            payload = json.dumps(body).encode()
+            try:
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # the client gave up waiting
+
+        def log_message(self, format, *args):
+            pass
+
+    server = project["StubWeatherServer"](("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    stats["base_url"] = f"http://127.0.0.1:{server.server_address[1]}/data/2.5/weather"
+    try:
+        yield stats
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_fetch_many_caps_requests_in_flight(project):
+    """No more than max_workers requests are outstanding at once"""
+    cities = [f"City {i}" for i in range(12)]
+    with stub_weather_api(project, {city: 0.1 for city in cities}) as api:
+        tracker = project["WeatherTracker"](db_path=":memory:", base_url=api["base_url"])
+        results = list(tracker.fetch_many(cities, max_workers=3, timeout=2.0))
+        tracker.close()
+    assert sorted(city for city, _, _ in results) == sorted(cities)
+    assert all(error is None for _, _, error in results)
+    assert api["max_in_flight"] == 3
+
+
+def test_fetch_many_yields_in_completion_order_with_errors(project):
+    """Results arrive as requests finish; timeouts and HTTP errors are yielded, not raised"""
+    delays = {"Stuck": 2.0, "Slow": 0.45, "Medium": 0.25, "Fast": 0.0}
+    with stub_weather_api(project, delays) as api:
+        tracker = project["WeatherTracker"](db_path=":memory:", base_url=api["base_url"])
+        results = list(tracker.fetch_many(["Stuck", "Slow", "Atlantis", "Medium", "Fast"],
+                                          max_workers=5, timeout=0.8))
+        tracker.close()
+
+    order = [city for city, _, _ in results]
+    assert order.index("Fast") < order.index("Medium") < order.index("Slow") < order.index("Stuck")
+    assert order.index("Atlantis") < order.index("Medium")
+    outcome = {city: (reading, error) for city, reading, error in results}
+    assert outcome["Slow"][0]["temperature"] == 12.5 and outcome["Slow"][1] is None
+    assert isinstance(outcome["Stuck"][1], requests.exceptions.Timeout)
+    assert isinstance(outcome["Atlantis"][1], requests.exceptions.HTTPError)
+
+
+def test_fetch_many_stops_early_without_waiting(project):
+    """Breaking out of the loop returns at once and never starts the remaining cities"""
+    cities = [f"City {i}" for i in range(20)]
+    delays = {city: 0.5 for city in cities}
+    delays["Fast"] = 0.0
+    with stub_weather_api(project, delays) as api:
+        tracker = project["WeatherTracker"](db_path=":memory:", base_url=api["base_url"])
+        start = time.perf_counter()
+        results = tracker.fetch_many(["Fast"] + cities, max_workers=2, timeout=2.0)
+        city, _, error = next(results)
+        results.close()
+        elapsed = time.perf_counter() - start
+        time.sleep(0.6)  # long enough for every queued city to have started if not cancelled
+        tracker.close()
+    assert (city, error) == ("Fast", None)
+    assert elapsed < 0.4
+    assert api["requests"] <= 3  # "Fast" plus what the two workers had already picked up
+
+
+def test_history_accepts_timestamps_with_offsets(project, tracker):
+    """Offsets are converted to naive UTC before they reach the tracker"""
+    tracker.save_many([reading()])
+    client = project["app"].test_client()
+    now = datetime.now(timezone.utc)
+
+    for start in ["2024-01-01T00:00:00+00:00", (now - timedelta(hours=1)).isoformat()]:
+        response = client.get("/api/history", query_string={"start": start})
+        assert response.status_code == 200, response.get_json()
+    body = response.get_json()
+    assert body["resolution"] == "raw" and body["count"] == 1
+
+    # An hour from now, written in UTC+3: must not match the reading just saved
+    later = (now + timedelta(hours=1)).astimezone(timezone(timedelta(hours=3))).isoformat()
+    assert client.get("/api/history", query_string={"start": later}).get_json()["count"] == 0
+    assert project["parse_utc"]("2024-01-01T02:00:00+02:00") == datetime(2024, 1, 1)
+
+
+def test_stats_are_maintained_by_the_database(project, tracker):
+    """Two trackers on one database see the same statistics as a pass over every reading"""
+    other = project["WeatherTracker"]()
+    temperatures = [4.5, -2.0, 11.25, None, 7.0, 3.5]
+    for i, temperature in enumerate(temperatures):
+        (tracker if i % 2 else other).save_many([reading(temperature=temperature, humidity=60 + i)])
+    tracker.save_many([reading(city="Bergen", humidity=None)])
+
+    expected = project["RunningStats"]()
+    for temperature in temperatures:
+        expected.update(temperature)
+    for source in (tracker, other):
+        stats = source.get_stats("Oslo")
+        assert stats["temperature"]["count"] == 5
+        assert stats["temperature"]["mean"] == pytest.approx(expected.mean)
+        assert stats["temperature"]["variance"] == pytest.approx(expected.variance)
+        assert (stats["temperature"]["min"], stats["temperature"]["max"]) == (-2.0, 11.25)
+        assert stats["humidity"]["count"] == 6
+    assert tracker.get_stats("Bergen")["humidity"]["count"] == 0
+    assert tracker.get_stats("Nowhere") is None
+    other.close()
+
+
+def test_add_weather_rejects_invalid_numbers(project, tracker):
+    """Non-numeric readings are a 400 and never reach the table or the statistics"""
+    client = project["app"].test_client()
+    for bad in [{"temperature": "warm"}, {"humidity": [70]}, {"temperature": True}, {"city": ""}]:
+        response = client.post("/api/add_weather", json={**reading(), **bad})
+        assert response.status_code == 400, bad
+    assert tracker.get_stats() == {}
+
+    response = client.post("/api/add_weather", json=reading(temperature="12.5", humidity=70.5))
+    assert response.status_code == 200
+    assert tracker.get_stats("Oslo")["temperature"]["mean"] == 12.5
+    with pytest.raises(ValueError):
+        tracker.submit(reading(temperature=float("nan")))
+
+
+def test_columnar_export_round_trips_fractional_humidity(project, tracker):
+    tracker.save_many([reading(humidity=70.5), reading(city="Bergen", temperature=None, humidity=None)])
+    export = project["export_weather_data"]("weather.wxc", fmt="columnar")
+    assert project["verify_export"](export["path"], export["sha256"])
+    rows = list(project["read_columnar"](export["path"]))
+    assert [(r["city"], r["temperature"], r["humidity"]) for r in rows] == [
+        ("Oslo", 4.5, 70.5), ("Bergen", None, None)]
+
+
+def test_failed_export_removes_partial_file(project, tracker, monkeypatch):
+    tracker.save_many([reading()])
+    export_globals = project["export_weather_data"].__globals__
+
+    def broken(kind, values):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setitem(export_globals, "_encode_column", broken)
+    with pytest.raises(RuntimeError):
+        project["export_weather_data"]("weather.wxc", fmt="columnar")
+    assert not os.path.exists("weather.wxc")
+    assert not os.path.exists("weather.wxc.sha256")
@@ -0,0 +1,360 @@
+"""
+Flask API示例 - 测试
+
+使用 Flask 测试客户端验证 flask_api_example 中各接口的行为。
+"""
+
+import pytest
+
+from flask_api_example import app, user_index, users_db
+
+
+@pytest.fixture
+def client():
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+
+def test_create_user_rejects_non_string_email(client):
+    """非字符串邮箱返回 400，且不会写入存储"""
+    count = len(users_db)
+    response = client.post('/users', json={'name': 'Bad', 'email': ['a']})
+    assert response.status_code == 400
+    assert len(users_db) == count
+
+    created = client.post('/users', json={'name': 'Ok', 'email': 'ok@example.com'}).get_json()['data']
+    response = client.put(f"/users/{created['id']}", json={'email': {'a': 1}})
+    assert response.status_code == 400
+    assert users_db[created['id']]['email'] == 'ok@example.com'
+
+    response = client.post('/users/batch', json=[{'name': 'Bad', 'email': 1}])
+    assert response.get_json()['data'][0]['success'] is False
+
+
+def test_failing_hook_does_not_block_other_hooks(client):
+    """某个变更回调失败时，其余回调（如邮箱索引）仍然执行"""
+    def broken(old, new):
+        raise RuntimeError('boom')
+
+    users_db._hooks.insert(0, broken)
+    try:
+        created = client.post('/users', json={'name': 'Hook', 'email': 'hook@example.com'})
+        assert created.status_code == 201
+        user_id = created.get_json()['data']['id']
+        assert user_id in user_index.by_email['hook@example.com']
+    finally:
+        users_db._hooks.remove(broken)
+
+
+def test_non_finite_age_is_rejected(client):
+    """NaN/Infinity 年龄返回 400，不会进入年龄索引打乱范围查询"""
+    for body in (b'{"name": "N", "email": "n@example.com", "age": NaN}',
+                 b'{"name": "I", "email": "i@example.com", "age": Infinity}'):
+        response = client.post('/users', data=body, content_type='application/json')
+        assert response.status_code == 400
+    created = client.post('/users', json={'name': 'Mid', 'email': 'mid@example.com', 'age': 40}).get_json()['data']
+    old = client.post('/users', json={'name': 'Old', 'email': 'old@example.com', 'age': 60}).get_json()['data']
+    response = client.put(f"/users/{created['id']}", data=b'{"age": NaN}', content_type='application/json')
+    assert response.status_code == 400
+    response = client.post('/users/batch', data=b'[{"name": "B", "email": "b@example.com", "age": -Infinity}]',
+                           content_type='application/json')
+    assert response.get_json()['data'][0]['success'] is False
+    assert client.get('/users', query_string={'age_min': 'nan'}).status_code == 400
+
+    users = client.get('/users', query_string={'age_min': 35, 'age_max': 45}).get_json()['data']
+    ids = [user['id'] for user in users]
+    assert created['id'] in ids and old['id'] not in ids
+    assert all(35 <= user['age'] <= 45 for user in users)
+
+
+@pytest.mark.parametrize('use_numpy', [True, False])
+def test_batch_calculate_rejects_non_numbers_and_maps_non_finite(client, monkeypatch, use_numpy):
+    """批量计算拒绝 null/字符串/布尔元素，溢出结果映射为 None"""
+    import flask_api_example
+    if not use_numpy:
+        monkeypatch.setattr(flask_api_example, 'np', None)
+
+    for bad in (None, '1', True):
+        response = client.post('/calculate', json={'num1': [1, bad], 'num2': [1, 1], 'operation': 'add'})
+        assert response.status_code == 400
+
+    response = client.post('/calculate', json={
+        'num1': [1e308, 6, 1], 'num2': [10, 0, 2], 'operation': ['multiply', 'divide', 'add']})
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    assert data['results'] == [None, None, 3]
+    assert data['division_by_zero'] == [1]
+    assert data['overflow'] == [0]
+    assert b'Infinity' not in response.data and b'NaN' not in response.data
+
+
+@pytest.mark.parametrize('use_orjson', [True, False])
+def test_jsonify_keeps_flask_default_types(monkeypatch, use_orjson):
+    """快速编码沿用 Flask 对 Decimal/日期/UUID 的处理，NaN 输出为 null"""
+    import json
+    import uuid
+    from datetime import date, datetime
+    from decimal import Decimal
+    import flask_api_example
+    if not use_orjson:
+        monkeypatch.setattr(flask_api_example, 'orjson', None)
+
+    value = {'price': Decimal('1.5'), 'day': date(2024, 1, 2), 'at': datetime(2024, 1, 2, 3, 4, 5),
+             'id': uuid.UUID(int=1), 'ratio': float('nan'), 'big': [float('inf'), 2 ** 70]}
+    with app.test_request_context():
+        data = json.loads(flask_api_example.jsonify(value).data)
+    assert data == {
+        'price': '1.5', 'day': 'Tue, 02 Jan 2024 00:00:00 GMT', 'at': 'Tue, 02 Jan 2024 03:04:05 GMT',
+        'id': '00000000-0000-0000-0000-000000000001', 'ratio': None, 'big': [None, 2 ** 70]}
+
+
+def test_calculate_rejects_non_finite_result(client):
+    response = client.post('/calculate', json={'num1': 1e308, 'num2': 10, 'operation': 'multiply'})
+    assert response.status_code == 400
+
+
+def test_sharded_store_updates_are_copy_on_write():
+    """更新生成新记录对象，读者之前拿到的记录不会被修改"""
+    from flask_api_example import ShardedStore
+
+    store = ShardedStore([{'id': 1, 'name': 'a'}])
+    before = store[1]
+    after = store.update(1, {'name': 'b'})
+    assert before == {'id': 1, 'name': 'a'}
+    assert after is store[1] and after is not before
+    assert store.update(99, {'name': 'x'}) is None and 99 not in store
+
+
+def test_sharded_store_concurrent_writes():
+    """并发创建得到唯一且有序的ID；跨分片的读-改-写不丢失更新也不会死锁"""
+    import threading
+    from flask_api_example import ShardedStore
+
+    store = ShardedStore([{'id': 1, 'n': 0}, {'id': 2, 'n': 0}], shard_count=4)
+    created = []
+
+    def worker(n):
+        keys = [1, 2] if n % 2 else [2, 1]  # 两种加锁顺序
+        for i in range(300):
+            created.append(store.create({'n': i})['id'])
+            store.modify(keys, lambda records: [{'n': record['n'] + 1} for record in records])
+        created.extend(record['id'] for record in store.create_many([{'n': 0}] * 10))
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(set(created)) == len(created) == 8 * 310
+    assert [record['id'] for record in store.values()] == sorted([1, 2] + created)
+    assert store[1]['n'] == store[2]['n'] == 8 * 300
+
+
+def test_journal_replays_concurrent_writes(tmp_path):
+    """多线程写入经写线程落盘后，恢复出的数据与原存储一致"""
+    import threading
+    from flask_api_example import ShardedStore, StoreJournal
+
+    store = ShardedStore()
+    journal = StoreJournal(str(tmp_path), {'users': store}, snapshot_every=250)
+    journal.recover()
+
+    def writer(offset):
+        for i in range(200):
+            record = store.create({'name': f'u{offset}-{i}', 'email': f'{offset}-{i}@example.com', 'age': i})
+            store.update(record['id'], {'age': i + 1})
+            if i % 3 == 0:
+                store.delete(record['id'])
+        journal.wait_written()
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    journal.close()
+
+    restored = ShardedStore()
+    StoreJournal(str(tmp_path), {'users': restored}).recover()
+    assert sorted(restored.values(), key=lambda r: r['id']) == sorted(store.values(), key=lambda r: r['id'])
+
+
+def test_batch_update_rejects_boolean_id(client):
+    """布尔值 id 不会被当作 1 更新用户 1"""
+    before = users_db[1]
+    response = client.post('/users/batch', json=[{'id': True, 'name': 'Hijacked'}])
+    result = response.get_json()['data'][0]
+    assert result['success'] is False
+    assert users_db[1] is before
+
+
+class _FullDisk:
+    """模拟磁盘已满的 WAL 文件"""
+
+    def writelines(self, lines):
+        import errno
+        raise OSError(errno.ENOSPC, 'No space left on device')
+
+    def close(self):
+        pass
+
+
+def test_journal_write_failure_fails_requests(client, tmp_path, monkeypatch):
+    """WAL 写入失败后等待者立即报错，请求返回 500 而不是一直阻塞"""
+    import flask_api_example
+    from flask_api_example import JournalError, ShardedStore, StoreJournal
+
+    store = ShardedStore()
+    journal = StoreJournal(str(tmp_path / 'direct'), {'users': store})
+    journal.recover()
+    journal._wal = _FullDisk()
+    store.create({'name': 'x', 'email': 'x@example.com', 'age': 1})
+    with pytest.raises(JournalError):
+        journal.wait_written()
+    journal.close()
+
+    hooks = list(users_db._hooks)
+    journal = StoreJournal(str(tmp_path / 'app'), {'users': users_db})
+    journal.recover()
+    journal._wal = _FullDisk()
+    monkeypatch.setattr(flask_api_example, 'journal', journal)
+    try:
+        response = client.post('/users', json={'name': 'Disk', 'email': 'disk@example.com'})
+        assert response.status_code == 500
+        assert response.get_json()['success'] is False
+        assert client.get('/users/1').status_code == 200  # 只读请求不受影响
+    finally:
+        users_db._hooks[:] = hooks
+        journal.close()
+
+
+def test_get_user_after_delete_is_not_served_from_cache(client):
+    """删除后再读取返回 404，旧 ETag 不会得到 304（包括从未修改过的初始用户）"""
+    created = client.post('/users', json={'name': 'Gone', 'email': 'gone@example.com'}).get_json()['data']
+    seed = users_db[3]
+    try:
+        for user_id in (created['id'], seed['id']):
+            first = client.get(f'/users/{user_id}')
+            assert first.status_code == 200
+            etag = first.headers['ETag']
+            assert client.get(f'/users/{user_id}', headers={'If-None-Match': etag}).status_code == 304
+
+            assert client.delete(f'/users/{user_id}').status_code == 200
+            assert client.get(f'/users/{user_id}').status_code == 404
+            response = client.get(f'/users/{user_id}', headers={'If-None-Match': etag})
+            assert response.status_code == 404
+            assert 'ETag' not in response.headers
+    finally:
+        users_db.put(seed)
+
+
+def test_record_versions_do_not_grow_with_churn():
+    """反复创建删除记录后，版本表大小只与现存记录数相关"""
+    from flask_api_example import ShardedStore
+
+    store = ShardedStore([{'id': 1, 'name': 'seed'}])
+    for i in range(1000):
+        record = store.create({'name': f'tmp{i}'})
+        store.update(record['id'], {'name': 'changed'})
+        store.delete(record['id'])
+    assert len(store._record_versions) <= len(store)
+    assert store.record_version(record['id']) is None
+
+    version = store.record_version(1)
+    store.put({'id': record['id'], 'name': 'back'})
+    assert store.record_version(record['id']) > version
+
+
+def test_release_is_capped_at_reserved_quantity(client):
+    """释放数量不能超过已预留数量，库存不会被凭空增加"""
+    product = client.post('/products', json={'name': 'Widget', 'price': 1.0, 'stock': 10}).get_json()['data']
+    product_id = product['id']
+    assert client.post(f'/products/{product_id}/release', json={'quantity': 1}).status_code == 409
+
+    reserved = client.post(f'/products/{product_id}/reserve', json={'quantity': 3}).get_json()['data'][0]
+    assert (reserved['stock'], reserved['reserved']) == (7, 3)
+    response = client.post('/products/release', json={'items': [{'id': product_id, 'quantity': 4}]})
+    assert response.status_code == 409
+
+    released = client.post(f'/products/{product_id}/release', json={'quantity': 3}).get_json()['data'][0]
+    assert (released['stock'], released['reserved']) == (10, 0)
+
+
+def test_reserve_rejects_boolean_id(client):
+    """布尔值 id 返回 400，不会预留产品 1 的库存"""
+    from flask_api_example import products_db
+
+    before = products_db[1]
+    response = client.post('/products/reserve', json={'items': [{'id': True, 'quantity': 1}]})
+    assert response.status_code == 400
+    assert products_db[1] is before
+
+
+def test_json_pretty_is_an_explicit_setting(client, monkeypatch):
+    """缩进输出只由 JSON_PRETTY 控制，调试模式不影响编码方式"""
+    monkeypatch.setattr(app, 'debug', True)
+    assert b'\n' not in client.get('/time').data
+
+    monkeypatch.setitem(app.config, 'JSON_PRETTY', True)
+    response = client.get('/time')
+    assert b'\n  ' in response.data
+    assert response.get_json()['success'] is True
+
+
+@pytest.mark.parametrize('path', ['/users', '/products'])
+def test_cursor_pages_and_stream_cover_the_whole_list(client, path):
+    """按 next_after 逐页读取与流式输出得到的记录和完整列表一致"""
+    for i in range(5):
+        client.post('/users', json={'name': f'Page{i}', 'email': f'page{i}@example.com'})
+        client.post('/products', json={'name': f'Page{i}', 'price': i})
+    full = client.get(path).get_json()
+    assert full['total'] == len(full['data'])
+
+    pages, after = [], None
+    while True:
+        query = {'limit': 2} if after is None else {'limit': 2, 'after': after}
+        body = client.get(path, query_string=query).get_json()
+        assert len(body['data']) <= 2 and body['total'] == full['total']
+        pages += body['data']
+        after = body['next_after']
+        if after is None:
+            break
+    assert pages == full['data']
+
+    streamed = client.get(path, query_string={'stream': 'true'})
+    assert streamed.is_streamed
+    assert streamed.get_json() == full
+    limited = client.get(path, query_string={'stream': '1', 'after': full['data'][0]['id'], 'limit': 3}).get_json()
+    assert limited == {'success': True, 'data': full['data'][1:4], 'total': 3}
+
+
+def test_metrics_count_requests_per_route(client, monkeypatch):
+    """按路由模板统计请求数和 5xx 错误数，/metrics 输出 Prometheus 文本格式"""
+    import flask_api_example
+    from flask_api_example import LatencyHistogram, RouteMetrics
+
+    monkeypatch.setattr(flask_api_example, 'metrics', RouteMetrics())
+    client.get('/users/1')
+    client.get('/users/2')
+    client.get('/users/999999')  # 404 不计为错误
+    flask_api_example.metrics.start()
+    flask_api_example.metrics.finish('GET', '/boom', 503, 0.01)
+
+    text = client.get('/metrics').get_data(as_text=True)
+    assert 'http_requests_total{method="GET",route="/users/<int:user_id>"} 3' in text
+    assert 'http_request_errors_total{method="GET",route="/users/<int:user_id>"} 0' in text
+    assert 'http_request_errors_total{method="GET",route="/boom"} 1' in text
+    assert 'http_request_duration_seconds_count{method="GET",route="/users/<int:user_id>"} 3' in text
+
+    summary = flask_api_example.metrics.summary()
+    assert summary['requests'] == 5 and summary['errors'] == 1  # 包括 /metrics 本身
+    assert summary['in_flight'] == 0
+
+    histogram = LatencyHistogram()
+    assert histogram.quantile(0.5) is None
+    for ms in range(1, 101):
+        histogram.observe(ms / 1000)
+    assert 0.04 <= histogram.quantile(0.5) <= 0.06
+    assert 0.09 <= histogram.quantile(0.99) <= 0.11